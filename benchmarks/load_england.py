@@ -0,0 +1,77 @@
+"""Benchmark the cold start time and peak memory of GpRegion.load_england().
+
+Each repeat runs in a fresh python process, so that imports and file caches inside the interpreter don't hide the
+startup cost a new worker or Streamlit server sees.
+
+Run as a module from the root directory of the project (.), as the GP data path is relative:
+
+  python3 -m benchmarks.load_england --repeat 5
+"""
+
+import argparse
+import json
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+
+def _max_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+
+def measure_once() -> dict:
+    """Time a single load_england in this process, including importing the library.
+
+    Peak memory is measured as the growth in the high water mark of the resident set during the load, rather than
+    with tracemalloc, which would slow down the timing.
+    """
+    start = time.perf_counter()
+    from nhstravel.gp import GpRegion
+
+    imported = time.perf_counter()
+    rss_before = _max_rss_mb()
+    region = GpRegion.load_england()
+    loaded = time.perf_counter()
+    return {
+        "import_s": imported - start,
+        "load_england_s": loaded - imported,
+        "load_peak_mb": _max_rss_mb() - rss_before,
+        "max_rss_mb": _max_rss_mb(),
+        "practices": len(region.get_df().index),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--single", action="store_true", help="measure one run in this process"
+    )
+    args = parser.parse_args()
+    if args.single:
+        print(json.dumps(measure_once()))
+        return
+
+    runs = []
+    for _ in range(args.repeat):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.load_england", "--single"],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    print(f"load_england over {len(runs)} cold runs, {runs[0]['practices']} practices")
+    for key in ["import_s", "load_england_s", "load_peak_mb", "max_rss_mb"]:
+        values = [run[key] for run in runs]
+        print(
+            f"  {key:<16} median {statistics.median(values):8.3f}"
+            f"  min {min(values):8.3f}  max {max(values):8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""Calculate walking distance polygons for every triangle of a GpRegion, in parallel, with resumable output.
+
+The work is split into chunks of triangles which are shared out across a pool of processes. Each finished chunk is
+written as its own GeoParquet file in the output directory, and those files are the checkpoint: when a run is
+interrupted and started again with the same output directory, triangles already in a file are skipped.
+
+Typical usage is:
+
+  england = GpRegion.load_england()
+  region = england.get_subregion_by_poly(poly)
+  calculate_walking_distance_polys_batch(region, "output/walking", processes=32)
+  polys = read_batch_output("output/walking")
+"""
+
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import glob
+import hashlib
+import json
+import os
+import time
+
+import geopandas as gpd
+import networkx
+import numpy as np
+import pandas as pd
+import pyarrow.parquet
+
+from nhstravel.gp import GpRegion
+from nhstravel.network import RoadNetwork
+from nhstravel.routing import CsrGraph
+from nhstravel.storage import atomic_write
+
+_MANIFEST_FILE = "manifest.json"
+_PART_PATTERN = "part-*.parquet"
+
+# Set in each worker process by _init_worker, so the region and graph are only sent once per process
+_worker_region: GpRegion = None
+_worker_settings: dict = None
+
+
+def calculate_walking_distance_polys_batch(
+    region: GpRegion,
+    output_dir: str,
+    processes: int = None,
+    chunk_size: int = 16,
+    travel_speed_kmh=4.5,
+    radius_minutes=5.0,
+    max_minutes: float = None,
+    graph: networkx.MultiDiGraph = None,
+    network: RoadNetwork = None,
+    verbose: bool = True,
+) -> dict:
+    """Calculate the walking distance polygons for every triangle in the region, as for
+    GpRegion.calculate_walking_distance_polys, writing them to GeoParquet files in output_dir.
+
+    :param region: the region to calculate all triangles for
+    :param output_dir: the directory for the output. If it has output from an earlier run for the same region and
+           settings, the triangles already done are skipped.
+    :param processes: the number of worker processes, defaulting to the number of CPUs
+    :param chunk_size: the number of triangles each worker does before writing them out
+    :param travel_speed_kmh: as for GpRegion.calculate_walking_distance_polys
+    :param radius_minutes: as for GpRegion.calculate_walking_distance_polys
+    :param max_minutes: as for GpRegion.calculate_walking_distance_polys
+    :param graph: optional - a pre-downloaded graph covering the region, or a CsrGraph of it, which is converted
+           to a CsrGraph once and sent once to each worker
+    :param network: optional - a local road network covering the region, which is sent once to each worker. This
+           is much smaller to send than a graph, and is used instead of graph if both are given
+    :param verbose: print progress and throughput as chunks finish
+    :return: a dict summarising the run, with the number of triangles "total", "skipped" as already done,
+             "computed" and "failed", and the "seconds" taken and "triangles_per_second"
+    :raises ValueError: if output_dir has output for a different region or different settings
+    """
+    settings = {
+        "travel_speed_kmh": travel_speed_kmh,
+        "radius_minutes": radius_minutes,
+        "max_minutes": max_minutes,
+    }
+    os.makedirs(output_dir, exist_ok=True)
+    _check_manifest(output_dir, region, settings)
+    n_triangles = len(region.get_triangle_corners())
+    done = completed_triangles(output_dir)
+    remaining = np.setdiff1d(np.arange(n_triangles), done)
+    chunks = [
+        remaining[start : start + chunk_size]
+        for start in range(0, len(remaining), chunk_size)
+    ]
+
+    if network is None and graph is not None and not isinstance(graph, CsrGraph):
+        # Convert once here rather than for every triangle, which also makes it much smaller to send to workers
+        graph = CsrGraph.from_graph(graph)
+
+    start_time = time.perf_counter()
+    computed = 0
+    failed = 0
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=_init_worker,
+        initargs=(region, graph, network, settings),
+    ) as executor:
+        futures = {
+            executor.submit(_run_chunk, chunk, output_dir): chunk for chunk in chunks
+        }
+        for future in as_completed(futures):
+            chunk = futures[future]
+            if future.exception() is not None:
+                failed += len(chunk)
+                if verbose:
+                    print(
+                        f"Triangles {chunk[0]}-{chunk[-1]} failed, "
+                        f"they will be retried on the next run: {future.exception()!r}"
+                    )
+                continue
+            computed += len(chunk)
+            if verbose:
+                elapsed = time.perf_counter() - start_time
+                rate = computed / elapsed
+                left = len(remaining) - computed - failed
+                print(
+                    f"{len(done) + computed}/{n_triangles} triangles done, "
+                    f"{rate:.2f} triangles/s, about {left / rate:.0f}s left"
+                )
+    seconds = time.perf_counter() - start_time
+    return {
+        "total": n_triangles,
+        "skipped": len(done),
+        "computed": computed,
+        "failed": failed,
+        "seconds": seconds,
+        "triangles_per_second": computed / seconds if seconds > 0 else 0.0,
+    }
+
+
+def completed_triangles(output_dir: str) -> np.ndarray:
+    """Gets the sorted indices of all triangles with output in the directory."""
+    parts = [
+        pyarrow.parquet.read_table(path, columns=["triangle"])
+        .column("triangle")
+        .to_numpy()
+        for path in glob.glob(os.path.join(output_dir, _PART_PATTERN))
+    ]
+    if not parts:
+        return np.array([], dtype=np.int64)
+    return np.unique(np.concatenate(parts))
+
+
+def read_batch_output(output_dir: str) -> gpd.GeoDataFrame:
+    """Read all the output of calculate_walking_distance_polys_batch into one GeoDataFrame.
+
+    :return: a GeoDataFrame with a row per triangle and bucket, with columns triangle, bucket_dist and the mp
+             MultiPolygon geometry, sorted by triangle and bucket
+    """
+    parts = [
+        gpd.read_parquet(path)
+        for path in sorted(glob.glob(os.path.join(output_dir, _PART_PATTERN)))
+    ]
+    if not parts:
+        return gpd.GeoDataFrame(
+            {
+                "triangle": np.array([], dtype=np.int64),
+                "bucket_dist": np.array([], dtype=np.int64),
+                "mp": gpd.GeoSeries([], crs="EPSG:4326"),
+            },
+            geometry="mp",
+        )
+    result = pd.concat(parts, ignore_index=True)
+    return result.sort_values(["triangle", "bucket_dist"], ignore_index=True)
+
+
+def _check_manifest(output_dir: str, region: GpRegion, settings: dict):
+    """Make sure output_dir is only ever used for one region and one set of settings, as triangles are only
+    identified by their index in the region."""
+    manifest = {
+        "triangles_sha256": hashlib.sha256(
+            np.ascontiguousarray(region.get_triangle_corners()).tobytes()
+        ).hexdigest(),
+        **settings,
+    }
+    path = os.path.join(output_dir, _MANIFEST_FILE)
+    if os.path.exists(path):
+        with open(path) as f:
+            existing = json.load(f)
+        if existing != manifest:
+            raise ValueError(
+                f"{output_dir} has output for a different region or settings: {existing}"
+            )
+    else:
+        with atomic_write(path, "w") as f:
+            json.dump(manifest, f, indent=2)
+
+
+def _init_worker(region: GpRegion, graph, network, settings: dict):
+    global _worker_region, _worker_settings
+    _worker_region = region
+    _worker_settings = {**settings, "graph": graph, "network": network}
+
+
+def _run_chunk(triangles: np.ndarray, output_dir: str):
+    """Calculate the polygons for a chunk of triangles in a worker, and write them out as one file."""
+    frames = []
+    for triangle in triangles:
+        polys = _worker_region.calculate_walking_distance_polys(
+            _worker_region.get_triangle(triangle), **_worker_settings
+        )
+        frames.append(
+            gpd.GeoDataFrame(
+                {
+                    "triangle": np.full(len(polys.index), triangle, dtype=np.int64),
+                    "bucket_dist": polys.index.to_numpy(dtype=np.int64),
+                    "mp": gpd.GeoSeries(polys["mp"].values, crs="EPSG:4326"),
+                },
+                geometry="mp",
+            )
+        )
+    result = pd.concat(frames, ignore_index=True)
+    # The first triangle is never already done, so names don't clash. Only complete chunks ever count as done, as
+    # the part file only appears once it is all written.
+    with atomic_write(
+        os.path.join(output_dir, f"part-{triangles[0]:07d}.parquet")
+    ) as f:
+        result.to_parquet(f)
@@ -1,6 +1,5 @@
 from __future__ import annotations
 import shapely
-import shapely.ops
 from shapely.geometry import Point, Polygon, MultiPoint, MultiPolygon
 from shapely.strtree import STRtree
 from matplotlib import pyplot
@@ -8,12 +7,17 @@ from descartes.patch import PolygonPatch
 import geopandas as gpd
 from haversine import haversine, Unit
 import math
+import numpy as np
+import os
 import networkx
 import osmnx
-import osmnx.distance
 import pandas as pd
+from scipy.spatial import cKDTree
 
 from nhstravel.loaders import gploader
+from nhstravel.network import RoadNetwork
+from nhstravel.routing import CsrGraph
+from nhstravel.storage import atomic_write
 
 
 class GpRegion:
@@ -28,6 +32,9 @@ class GpRegion:
     - longitude: the longitude of the GP practice
     - point: the location as a (Longitude, Latitude) shapely point
 
+    The triangulation is kept as numpy arrays: the distinct practice locations, and the indices of the three corner
+    locations of each triangle. Shapely Polygons for the triangles are only built when asked for, with get_triangles().
+
     Typical usage is:
 
       area = GpRegion.load_england()
@@ -38,19 +45,157 @@ class GpRegion:
     """
 
     @staticmethod
-    def load_england():
+    def load_england(
+        gp_data_path="data/gp_data.csv",
+        only_england_grouping=True,
+        only_gp=True,
+        only_active=True,
+        snapshot_path: str = None,
+    ):
         """Loads the EPPRACUR GP dataset and precached locations from a defined file path.
 
+        The filter arguments are as for gploader.load_england.
+
+        :param snapshot_path: optional - a file to keep a prebuilt copy of the region in. If the file was saved from
+               the same GP data file content and filters, the region is loaded from it instead of being rebuilt.
+               Otherwise the region is built and the file is (re)written.
         Returns: a GpArea with all English GP practices.
         """
-        return GpRegion._from_df(gploader.load_england())
+        filters = {
+            "gp_data_path": gp_data_path,
+            "only_england_grouping": only_england_grouping,
+            "only_gp": only_gp,
+            "only_active": only_active,
+        }
+        if snapshot_path is None:
+            return GpRegion._from_df(gploader.load_england(**filters))
+        source_hash = gploader.load_england_hash(**filters)
+        region = GpRegion.load_snapshot(snapshot_path, source_hash)
+        if region is None:
+            region = GpRegion._from_df(gploader.load_england(**filters))
+            region.save_snapshot(snapshot_path, source_hash)
+        return region
 
-    _df: pd.DataFrame
-    _triangulation: list[Polygon]
+    @staticmethod
+    def load_snapshot(path: str, source_hash: str = None) -> GpRegion | None:
+        """Loads a region saved with save_snapshot.
+
+        :param path: the snapshot file
+        :param source_hash: optional - if given, the snapshot is only used if it was saved with the same hash
+        :return: the region, or None if there is no snapshot file or it was saved with a different hash
+        """
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as snapshot:
+            if snapshot["version"] != _SNAPSHOT_VERSION or (
+                source_hash is not None and snapshot["source_hash"] != source_hash
+            ):
+                return None
+            columns = {}
+            for column in _SNAPSHOT_STRING_COLUMNS:
+                values = np.char.decode(snapshot[column], "utf-8").astype(object)
+                values[snapshot[column + "/isnull"]] = np.nan
+                columns[column] = values
+            for column in _SNAPSHOT_FLOAT_COLUMNS:
+                columns[column] = snapshot[column]
+            df = pd.DataFrame(
+                columns,
+                index=pd.Index(
+                    snapshot["index"], name=snapshot["index_name"].item() or None
+                ),
+                columns=_SNAPSHOT_COLUMNS,
+            )
+            df["point"] = shapely.points(
+                np.column_stack([df["longitude"], df["latitude"]])
+            )
+            return GpRegion(
+                df,
+                snapshot["vertices"],
+                snapshot["simplices"],
+                snapshot["practice_vertices"],
+            )
+
+    def save_snapshot(self, path: str, source_hash: str = ""):
+        """Saves the region, including its triangulation, to a binary numpy .npz file with an array per column.
+
+        The file is written to a temporary file and then moved into place, so processes loading it at the same time
+        never see a partly written snapshot.
+
+        :param path: the snapshot file
+        :param source_hash: a hash of the data the region was built from, see gploader.load_england_hash
+        """
+        arrays = {
+            "version": np.array(_SNAPSHOT_VERSION),
+            "source_hash": np.array(source_hash),
+            "index": self._df.index.to_numpy(),
+            "index_name": np.array(self._df.index.name or ""),
+            "vertices": self._vertices,
+            "simplices": self._simplices,
+            "practice_vertices": self._practice_vertices,
+        }
+        for column in _SNAPSHOT_STRING_COLUMNS:
+            values = self._df[column]
+            arrays[column] = np.char.encode(
+                values.fillna("").astype(str).to_numpy(dtype=str), "utf-8"
+            )
+            arrays[column + "/isnull"] = values.isna().to_numpy()
+        for column in _SNAPSHOT_FLOAT_COLUMNS:
+            arrays[column] = self._df[column].to_numpy(dtype=np.float64)
+        with atomic_write(path) as f:
+            np.savez(f, **arrays)
 
-    def __init__(self, df: pd.DataFrame, triangulation: list[Polygon]):
+    _df: pd.DataFrame
+    # (n_vertices, 2) array of the distinct (Longitude, Latitude) practice locations. This is shared between a
+    # region and all its subregions, so subregions use the same vertex indices
+    _vertices: np.ndarray
+    # a lookup from location to index in _vertices, shared in the same way as _vertices
+    _vertex_lookup: _VertexLookup
+    # (n_triangles, 3) array of indices into _vertices for the corners of each triangle, in anticlockwise order
+    _simplices: np.ndarray
+    # for each row of _df (by position), the index into _vertices of its location
+    _practice_vertices: np.ndarray
+    # vertex to triangles index: the triangles with vertex v as a corner are
+    # _vertex_triangles[_vertex_triangle_offsets[v]:_vertex_triangle_offsets[v + 1]]
+    _vertex_triangle_offsets: np.ndarray
+    _vertex_triangles: np.ndarray
+    # vertex to practices index, in the same way, with positional rows of _df
+    _vertex_row_offsets: np.ndarray
+    _vertex_rows: np.ndarray
+    # spatial index over the triangles, built when first needed
+    _triangle_tree: STRtree | None
+    # indices for searching by name and postcode, built when first needed
+    _name_index: _NgramIndex | None
+    _postcode_index: _PrefixIndex | None
+    # k-d tree of the practice locations as unit vectors, built when first needed
+    _practice_tree: cKDTree | None
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        vertices: np.ndarray,
+        simplices: np.ndarray,
+        practice_vertices: np.ndarray,
+        vertex_lookup: _VertexLookup = None,
+    ):
         self._df = df
-        self._triangulation = triangulation
+        self._vertices = vertices
+        self._vertex_lookup = (
+            vertex_lookup if vertex_lookup is not None else _VertexLookup(vertices)
+        )
+        self._simplices = simplices
+        self._practice_vertices = practice_vertices
+        n_vertices = len(vertices)
+        self._vertex_triangle_offsets, corner_positions = _group_by_vertex(
+            simplices.ravel(), n_vertices
+        )
+        self._vertex_triangles = corner_positions // 3
+        self._vertex_row_offsets, self._vertex_rows = _group_by_vertex(
+            practice_vertices, n_vertices
+        )
+        self._triangle_tree = None
+        self._name_index = None
+        self._postcode_index = None
+        self._practice_tree = None
 
     @classmethod
     def _from_df(cls, df):
@@ -73,11 +218,25 @@ class GpRegion:
             ]
         ]
         mydf = mydf[pd.notnull(mydf["latitude"])].copy()
+        coords = np.column_stack(
+            [
+                mydf["longitude"].to_numpy(dtype=np.float64),
+                mydf["latitude"].to_numpy(dtype=np.float64),
+            ]
+        )
         # fill in the location as a shapely point
-        mydf["point"] = mydf.apply(_row_to_point, axis=1)
-        # Get a set of deduplicated point tuples (as tuples as Point doesn't hash)
-        points = {(p.x, p.y) for p in mydf.dropna()["point"]}
-        return cls(mydf, shapely.ops.triangulate(MultiPoint(list(points))))
+        mydf["point"] = shapely.points(coords)
+        # Get the deduplicated locations, and which of them each practice is at
+        vertices, practice_vertices = np.unique(coords, axis=0, return_inverse=True)
+        practice_vertices = practice_vertices.reshape(-1)
+        vertex_lookup = _VertexLookup(vertices)
+        triangles = shapely.get_parts(
+            shapely.delaunay_triangles(shapely.multipoints(vertices))
+        )
+        # Each triangle is a closed ring of 4 coordinates, so drop the repeated last one
+        corners = shapely.get_coordinates(triangles).reshape(-1, 4, 2)[:, 0:3]
+        simplices = vertex_lookup.find(corners.reshape(-1, 2)).reshape(-1, 3)
+        return cls(mydf, vertices, simplices, practice_vertices, vertex_lookup)
 
     def get_df(self) -> pd.DataFrame:
         """Gets the internal GP practice dataframe."""
@@ -88,16 +247,28 @@ class GpRegion:
 
         The argument substring is changed to uppercase as the EPPRACUR dataset has names in uppercase.
 
+        The name_substring can also be a regular expression, as with pandas str.contains. Plain substrings are
+        looked up in an index of the names, built on first use, so only the names that could match are checked.
+
         :return: a pandas dataframe with just the rows for matching GP practices
         """
-        return self._df[self._df["Name"].str.contains(name_substring.upper())]
+        name_substring = name_substring.upper()
+        if _REGEX_SPECIAL_CHARACTERS.intersection(name_substring):
+            return self._df[self._df["Name"].str.contains(name_substring)]
+        if self._name_index is None:
+            self._name_index = _NgramIndex(self._df["Name"].to_numpy())
+        return self._df.iloc[self._name_index.find(name_substring)]
 
     def find_practices_postcode_prefix(self, postcode_prefix: str) -> pd.DataFrame:
         """Finds all gp practices with a postcode that starts with a given prefix.
 
+        The postcodes are sorted on first use, so each lookup is a binary search for the range of matches.
+
         :return: a pandas dataframe with just the rows for matching GP practices
         """
-        return self._df[self._df["Postcode"].str.startswith(postcode_prefix.upper())]
+        if self._postcode_index is None:
+            self._postcode_index = _PrefixIndex(self._df["Postcode"].to_numpy())
+        return self._df.iloc[self._postcode_index.find(postcode_prefix.upper())]
 
     def get_practice_area(self, index) -> GpArea:
         """Gets a local catchment area of a GP defined by a polygon out to all the surrounding GP practices.
@@ -108,25 +279,142 @@ class GpRegion:
         :param index: the index label for the practice in the dataframe, used for lookup with .loc
         :return: a shapely Polygon for the catchment area
         """
-        location: Point = self._df.loc[index]["point"]
-        area: Polygon = _find_loop(location, self._triangulation)
-        return GpArea(area, self._df.loc[index])
+        vertex = self._practice_vertices[self._df.index.get_loc(index)]
+        return GpArea(self._loop_polygon(vertex), self._df.loc[index])
+
+    def nearest_practices(
+        self, lats, lons, k: int = 1
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Finds the k nearest practices to each of a set of points, by great circle distance.
+
+        The practice locations are put in a k-d tree of 3D unit vectors on first use, where the straight line
+        distance increases with the great circle distance, so each query is a fast tree search.
+
+        :param lats: the latitudes of the points, as an array
+        :param lons: the longitudes of the points, as an array of the same length
+        :param k: the number of practices to find for each point
+        :return: indices and distances, each a (len(lats), k) array, where row i has the index labels in the
+                 practice dataframe of the practices nearest point i, and their distances in metres, nearest first
+        :raises ValueError: if k is more than the number of practices in the region
+        """
+        if not 1 <= k <= len(self._df.index):
+            raise ValueError(
+                f"k must be between 1 and the number of practices, {len(self._df.index)}, not {k}"
+            )
+        if self._practice_tree is None:
+            self._practice_tree = cKDTree(
+                _unit_vectors(self._df["latitude"], self._df["longitude"])
+            )
+        chords, rows = self._practice_tree.query(
+            _unit_vectors(lats, lons), k=k, workers=-1
+        )
+        n_points = len(rows)
+        rows = rows.reshape(n_points, k)
+        distances = 2 * _EARTH_RADIUS_M * np.arcsin(np.minimum(chords / 2, 1.0))
+        return self._df.index.to_numpy()[rows], distances.reshape(n_points, k)
+
+    def get_all_practice_areas(self) -> gpd.GeoSeries:
+        """Gets the catchment area polygon (as for get_practice_area) for every practice in the region.
+
+        Each distinct location is only looped around once, so practices sharing a Health Centre share the work.
+
+        :return: a geopandas GeoSeries of Polygons, with the same index as the practice dataframe
+        """
+        vertices, practice_loops = np.unique(
+            self._practice_vertices, return_inverse=True
+        )
+        loops = np.array(
+            [self._loop_polygon(vertex) for vertex in vertices], dtype=object
+        )
+        return gpd.GeoSeries(
+            loops[practice_loops].reshape(-1), index=self._df.index, name="area"
+        )
+
+    def get_triangles(self) -> gpd.GeoSeries:
+        """Gets the triangles of the triangulation as shapely Polygons. These are built on demand, so avoid calling
+        this in a loop.
+
+        :return: a geopandas GeoSeries of Polygons, indexed by triangle number
+        """
+        return gpd.GeoSeries(self._triangle_polygons())
+
+    def get_triangle_corners(self) -> np.ndarray:
+        """Gets the corners of every triangle in the triangulation.
+
+        :return: an (n_triangles, 3, 2) array of the (Longitude, Latitude) of the three corners of each triangle
+        """
+        return self._vertices[self._simplices]
+
+    def get_triangle(self, triangle_index: int) -> Polygon:
+        """Gets a single triangle of the triangulation as a shapely Polygon."""
+        return Polygon(self._vertices[self._simplices[triangle_index]])
+
+    def locate_triangles(self, points) -> tuple[np.ndarray, np.ndarray]:
+        """Finds the triangle containing each of a set of points, and the practices at its corners.
+
+        Candidate triangles are found with the spatial index over the triangles, then checked with a vectorised
+        test of which side of each edge the point is on.
+
+        :param points: an (n, 2) array of (Longitude, Latitude) points
+        :return: triangles and practices. triangles is an (n,) array of the index of the triangle containing each
+                 point, as used by get_triangle, or -1 for points outside the triangulation. Points on an edge
+                 shared by two triangles get the lower index. practices is an (n, 3) array of the positional row
+                 in get_df() of a practice at each corner of the triangle, or -1 for points outside or for a corner
+                 with no practice in this region. Where several practices share a corner, the first is given.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        # Done in chunks, to bound the memory used for candidate triangles
+        triangles = np.concatenate(
+            [
+                self._locate_triangles_chunk(points[start : start + _LOCATE_CHUNK_SIZE])
+                for start in range(0, len(points), _LOCATE_CHUNK_SIZE)
+            ]
+            or [np.array([], dtype=np.int64)]
+        )
+        found = triangles >= 0
+
+        practices = np.full((len(points), 3), -1, dtype=np.int64)
+        corners = self._simplices[triangles[found]]
+        starts = self._vertex_row_offsets[corners]
+        has_practice = self._vertex_row_offsets[corners + 1] > starts
+        practices[found] = np.where(
+            has_practice,
+            self._vertex_rows[np.minimum(starts, len(self._vertex_rows) - 1)],
+            -1,
+        )
+        return triangles, practices
+
+    def _locate_triangles_chunk(self, points: np.ndarray) -> np.ndarray:
+        point_ids, candidates = self._get_triangle_tree().query(shapely.points(points))
+        # Inside (or on the edge of) an anticlockwise triangle is on the left of (or on) all three edges
+        starts = self._vertices[self._simplices[candidates]]
+        edges = np.roll(starts, -1, axis=1) - starts
+        offsets = points[point_ids][:, np.newaxis, :] - starts
+        cross = edges[..., 0] * offsets[..., 1] - edges[..., 1] * offsets[..., 0]
+        inside = (cross >= 0).all(axis=1)
+
+        n_triangles = len(self._simplices)
+        triangles = np.full(len(points), n_triangles, dtype=np.int64)
+        np.minimum.at(triangles, point_ids[inside], candidates[inside])
+        triangles[triangles == n_triangles] = -1
+        return triangles
 
     def get_subregion_by_poly(self, poly: Polygon) -> GpRegion:
         """Creates a new GP Region that includes only the triangles which overlap the given polygon. Note that this
         will include some locations outside the polygon, to produce a surrounding ring, which makes it more likely
         travel times within the polygon will be accurate."""
-        subtriangulation = []
-        locations = set()
-        for triangle in self._triangulation:
-            if triangle.intersects(poly):
-                subtriangulation.append(triangle)
-                for coord in list(triangle.exterior.coords)[0:3]:
-                    locations.add((coord[0], coord[1]))
-        subdf = self._df.loc[
-            self._df["point"].apply(lambda p: (p.x, p.y)).isin(locations)
-        ]
-        return GpRegion(subdf, subtriangulation)
+        triangles = np.sort(
+            self._get_triangle_tree().query(poly, predicate="intersects")
+        )
+        sub_simplices = self._simplices[triangles]
+        rows = self._rows_at_vertices(np.unique(sub_simplices))
+        return GpRegion(
+            self._df.iloc[rows],
+            self._vertices,
+            sub_simplices,
+            self._practice_vertices[rows],
+            self._vertex_lookup,
+        )
 
     def get_subregion_by_filter(self, filter: pd.core.series.Series):
         """Creates a new subregion that uses the same triangles, but filters down to specific GP practices using the
@@ -141,19 +429,22 @@ class GpRegion:
         :param filter a pandas Series that can be used to index _df
         """
         sub_df = self._df.loc[filter]
-        locations = set([(p.x, p.y) for p in sub_df["point"].tolist()])
-        sub_tr = []
-        for triangle in self._triangulation:
-            for coord in list(triangle.exterior.coords)[0:3]:
-                if coord in locations:
-                    sub_tr.append(triangle)
-                    break
-        return GpRegion(sub_df, sub_tr)
+        sub_practice_vertices = self._practice_vertices[
+            self._df.index.get_indexer(sub_df.index)
+        ]
+        touching = np.isin(self._simplices, sub_practice_vertices).any(axis=1)
+        return GpRegion(
+            sub_df,
+            self._vertices,
+            self._simplices[touching],
+            sub_practice_vertices,
+            self._vertex_lookup,
+        )
 
     def pretty_plot(self, poly=None):
         """Plot the triangulation and points, and optionally an overlaying polygon"""
         fig, ax = pyplot.subplots()
-        gpd.GeoSeries(self._triangulation).plot(ax=ax)
+        self.get_triangles().plot(ax=ax)
         if poly is not None:
             gpd.GeoSeries([poly]).plot(ax=ax, ec="black", color="None")
         gpd.GeoDataFrame(self._df, geometry="point").plot(ax=ax, color="green")
@@ -164,13 +455,21 @@ class GpRegion:
         travel_speed_kmh=4.5,
         radius_minutes=5.0,
         graph: networkx.MultiDiGraph = None,
+        max_minutes: float = None,
+        network: RoadNetwork = None,
     ):
         """
         :param triangle: the triangle within this region to calculate the polys for
         :param travel_speed_kmh: the assumed walking speed in km/h
         :param radius_minutes: the time in minutes to put in each polygon. Eg, if 5, the first polygon will be places
                0-5 minutes walk, the second 5-10 minutes walk and so on
-        :param graph: optional - a pre-downloaded graph which can be used to get the graph without a network fetch
+        :param graph: optional - a pre-downloaded graph which can be used to get the graph without a network fetch.
+               This can be an osmnx graph, or a CsrGraph, which saves converting it on every call
+        :param max_minutes: optional - stop searching for routes longer than this, and put everywhere further away
+               in a single last bucket. Eg, with radius_minutes of 10 and max_minutes of 25, the last bucket is the
+               fourth, for everywhere over 25 minutes walk
+        :param network: optional - a local road network to cut the graph from without a network fetch. This is
+               used instead of graph if both are given
         :return: A geopandas dataframe with:
            index bucket_dist where 0 is the first bucket of points (eg 0-5 minutes) and so on
            mp a MultiPolygon of areas that are the distance away for that bucket
@@ -197,46 +496,33 @@ class GpRegion:
 
         surrounding_poly = self._polygon_surrounding_triangle(triangle)
         # Load the osm_graph for the area surrounding the triangle
-        if graph is not None:
-            osmgraph = osmnx.graph_from_polygon(
-                polygon=surrounding_poly, simplify=True, network_type="walk"
+        if network is not None:
+            csrgraph = network.csr_subgraph(surrounding_poly)
+        elif graph is None:
+            csrgraph = CsrGraph.from_graph(
+                osmnx.graph_from_polygon(
+                    polygon=surrounding_poly, simplify=True, network_type="walk"
+                )
             )
         else:
-            osmgraph = osmnx.truncate.truncate_graph_polygon(
-                graph, surrounding_poly, retain_all=True
-            )
-        corner_a, corner_b, corner_c, ignored = triangle.exterior.coords
-        # This could be optimized by only looking at nodes within the triangle
-        # networkx does not support this, but it wouldn't be hard to code - just a BFS
-        # and stop when all target nodes are reached. Leave the optimization until later,
-        node_distances_a: dict[int, float] = _get_all_node_distances(osmgraph, corner_a)
-        node_distances_b: dict[int, float] = _get_all_node_distances(osmgraph, corner_b)
-        node_distances_c: dict[int, float] = _get_all_node_distances(osmgraph, corner_c)
-
-        # for each node, build a dataframe with the index, a Point, the distance to the GP surgery, and which
-        # bucket it is in
-        node_data = pd.DataFrame(
-            [
-                {
-                    "node_index": u,
-                    "point": Point(node["x"], node["y"]),
-                    "dist": min(
-                        [node_distances_a[u], node_distances_b[u], node_distances_c[u]]
-                    ),
-                    "bucket_dist": math.floor(
-                        min(
-                            [
-                                node_distances_a[u],
-                                node_distances_b[u],
-                                node_distances_c[u],
-                            ]
-                        )
-                        / bucket_distance_m
-                    ),
-                }
-                for u, node in osmgraph.nodes(data=True)
-                if triangle.contains(Point(node["x"], node["y"]))
-            ]
+            if not isinstance(graph, CsrGraph):
+                graph = CsrGraph.from_graph(graph)
+            csrgraph = graph.subgraph(surrounding_poly)
+        inside = csrgraph.inside(triangle)
+        if not inside.any():
+            # If we have no points, then assume a single triangle. Not perfect, maybe revisit
+            return _single_bucket_polygon(triangle, 0)
+        corner_nodes = csrgraph.nearest(list(triangle.exterior.coords)[0:3])
+        # A single search from all three corners at once gives every node the distance to its nearest corner
+        max_distance_m = _max_distance_m(travel_speed_kmh, max_minutes)
+        node_distances = csrgraph.shortest_path_lengths(
+            corner_nodes,
+            cutoff=max_distance_m,
+            reverse=True,
+            targets=np.flatnonzero(inside),
+        )
+        node_data = _build_node_data(
+            csrgraph, inside, node_distances, bucket_distance_m, max_distance_m
         )
         if len(node_data.index) == 0:
             # If we have no points, then assume a single triangle. Not perfect, maybe revisit
@@ -244,14 +530,49 @@ class GpRegion:
         return _join_distances_to_polygons(node_data, triangle)
 
     def _polygon_surrounding_triangle(self, triangle: Polygon):
-        triangle_points = list(triangle.exterior.coords)[0:3]
-        triangle_points_set = set(triangle_points)
-        surrounding_points = set()
-        for other_triangle in self._triangulation:
-            coords = set(list(other_triangle.exterior.coords)[0:3])
-            if not triangle_points_set.isdisjoint(coords):
-                surrounding_points.update(coords)
-        return MultiPoint(list(surrounding_points)).convex_hull
+        corners = self._vertex_lookup.find(shapely.get_coordinates(triangle)[0:3])
+        triangles = np.concatenate(
+            [self._triangles_with_corner(corner) for corner in corners]
+        )
+        surrounding_vertices = np.unique(self._simplices[triangles])
+        return MultiPoint(self._vertices[surrounding_vertices]).convex_hull
+
+    def _triangles_with_corner(self, vertex: int) -> np.ndarray:
+        """Gets the indices of all triangles with the given vertex as a corner, in increasing order."""
+        return self._vertex_triangles[
+            self._vertex_triangle_offsets[vertex] : self._vertex_triangle_offsets[
+                vertex + 1
+            ]
+        ]
+
+    def _rows_at_vertices(self, vertices: np.ndarray) -> np.ndarray:
+        """Gets the positional rows in _df of all practices at any of the given vertices, in increasing order.
+
+        This only looks at the practices at those vertices, so takes time in proportion to the result.
+        """
+        starts = self._vertex_row_offsets[vertices]
+        counts = self._vertex_row_offsets[vertices + 1] - starts
+        # the position of each result within the run of rows of its vertex
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return np.sort(self._vertex_rows[np.repeat(starts, counts) + within])
+
+    def _get_triangle_tree(self) -> STRtree:
+        """Gets a spatial index over the triangles, building it on first use."""
+        if self._triangle_tree is None:
+            self._triangle_tree = STRtree(self._triangle_polygons())
+        return self._triangle_tree
+
+    def _loop_polygon(self, vertex: int) -> Polygon:
+        loop = _find_loop(vertex, self._simplices[self._triangles_with_corner(vertex)])
+        if len(loop) == 0:
+            raise ValueError(
+                "No triangles were found overlapping with point "
+                + str(Point(self._vertices[vertex]))
+            )
+        return Polygon(self._vertices[loop])
+
+    def _triangle_polygons(self) -> np.ndarray:
+        return shapely.polygons(self._vertices[self._simplices])
 
 
 class GpArea:
@@ -267,42 +588,56 @@ class GpArea:
     def location(self) -> Point:
         return self.row["point"]
 
-    def osm_graph(self) -> networkx.classes.multidigraph.MultiDiGraph:
-        """Load the osmnx open streetmap graph for this area."""
+    def osm_graph(
+        self, network: RoadNetwork = None
+    ) -> networkx.classes.multidigraph.MultiDiGraph:
+        """Load the osmnx open streetmap graph for this area.
+
+        :param network: optional - a local road network to cut the graph from, instead of downloading it
+        """
+        if network is not None:
+            return network.subgraph(self.area)
         return osmnx.graph_from_polygon(
             polygon=self.area, simplify=True, network_type="walk"
         )
 
     def calculate_walking_distance_polys(
-        self, osmgraph, travel_speed_kmh=4.5, radius_minutes=5.0
+        self,
+        osmgraph,
+        travel_speed_kmh=4.5,
+        radius_minutes=5.0,
+        max_minutes: float = None,
     ):
         """
 
+        :param osmgraph: the graph for the area, as from osm_graph, or a CsrGraph
         :param travel_speed_kmh: the assumed walking speed in km/h
         :param radius_minutes: the time in minutes to put in each polygon. Eg, if 5, the first polygon will be places
                0-5 minutes walk, the second 5-10 minutes walk and so on
+        :param max_minutes: optional - stop searching for routes longer than this, and put everywhere further away
+               in a single last bucket. Eg, with radius_minutes of 10 and max_minutes of 25, the last bucket is the
+               fourth, for everywhere over 25 minutes walk
         :return: A geopandas dataframe with:
            index bucket_dist where 0 is the first bucket of points (eg 0-5 minutes) and so on
            mp a MultiPolygon of areas that are the distance away for that bucket
            area as for mp, but could be a Polygon for areas which are only one polygon
         """
         location = self.row["point"]
-        node_distances = _get_all_node_distances(osmgraph, (location.x, location.y))
         bucket_distance_m: float = 1000 * travel_speed_kmh * radius_minutes / 60.0
-
-        # for each node, build a dataframe with the index, a Point, the distance to the GP surgery, and which
-        # bucket it is in
-        node_data = pd.DataFrame(
-            [
-                {
-                    "node_index": u,
-                    "point": Point(node["x"], node["y"]),
-                    "dist": node_distances[u],
-                    "bucket_dist": math.floor(node_distances[u] / bucket_distance_m),
-                }
-                for u, node in osmgraph.nodes(data=True)
-                if self.area.contains(Point(node["x"], node["y"]))
-            ]
+        max_distance_m = _max_distance_m(travel_speed_kmh, max_minutes)
+        if not isinstance(osmgraph, CsrGraph):
+            osmgraph = CsrGraph.from_graph(osmgraph)
+        inside = osmgraph.inside(self.area)
+        if not inside.any():
+            return _single_bucket_polygon(self.area, 0)
+        node_distances = osmgraph.shortest_path_lengths(
+            osmgraph.nearest([(location.x, location.y)]),
+            cutoff=max_distance_m,
+            reverse=True,
+            targets=np.flatnonzero(inside),
+        )
+        node_data = _build_node_data(
+            osmgraph, inside, node_distances, bucket_distance_m, max_distance_m
         )
         return _join_distances_to_polygons(node_data, self.area)
 
@@ -331,65 +666,252 @@ class GpArea:
             )
 
 
-def _to_triangles(point: Point, triangulation: list[Polygon]):
-    """Get all the triangles with a corner of a particular point
+# Columns of the practice dataframe saved in snapshots. The point column is rebuilt from latitude and longitude.
+_SNAPSHOT_STRING_COLUMNS = [
+    "Name",
+    "Postcode",
+    "National Grouping",
+    "High Level Health Geography",
+]
+_SNAPSHOT_FLOAT_COLUMNS = ["latitude", "longitude"]
+_SNAPSHOT_COLUMNS = [
+    "Name",
+    "Postcode",
+    "latitude",
+    "longitude",
+    "National Grouping",
+    "High Level Health Geography",
+]
+# Snapshots saved with a different version are rebuilt rather than loaded
+_SNAPSHOT_VERSION = 1
+# Names are indexed by all their substrings up to this length
+_NGRAM_LENGTH = 3
+_NO_POSITIONS = np.array([], dtype=np.int64)
+# The number of points located at a time by locate_triangles
+_LOCATE_CHUNK_SIZE = 1 << 18
+# The mean radius of the earth, as used by haversine
+_EARTH_RADIUS_M = 6371008.8
+# Name searches containing these are treated as regular expressions, as pandas str.contains does
+_REGEX_SPECIAL_CHARACTERS = set(".^$*+?{}[]\\|()")
+
+
+class _VertexLookup:
+    """A lookup from exact (x, y) coordinates to their index in an array of distinct vertices."""
+
+    def __init__(self, vertices: np.ndarray):
+        # complex numbers sort by real then imaginary part, which gives a single sortable key per coordinate
+        keys = _coordinate_keys(vertices)
+        self._order = np.argsort(keys)
+        self._sorted_keys = keys[self._order]
+
+    def find(self, coords: np.ndarray) -> np.ndarray:
+        """Find the vertex indices of an (n, 2) array of coordinates.
+
+        :raises ValueError: if any of the coordinates is not a vertex
+        """
+        keys = _coordinate_keys(coords)
+        positions = np.searchsorted(self._sorted_keys, keys)
+        positions = np.minimum(positions, len(self._sorted_keys) - 1)
+        if len(keys) and not (self._sorted_keys[positions] == keys).all():
+            raise ValueError("Coordinates are not all vertices of the triangulation")
+        return self._order[positions]
+
+
+class _NgramIndex:
+    """An index for finding the strings in an array which contain a substring.
 
-    :param point: a point which should be a corner of some triangles
-    :param triangulation: the list of all triangles
-    :return: all triangles that contain the point, with the point as the first coordinate, maintaining the cyclical
-             order of the points
+    Every substring (n-gram) of up to _NGRAM_LENGTH characters is mapped to the positions of the strings containing
+    it. Shorter queries are then a single lookup, and longer queries only need checking against the strings which
+    contain all of their n-grams.
     """
-    p = (point.x, point.y)
-    result = []
-    # This could be faster by preprocessing, but just the loop is quick enough
-    # loop over triangles to find first triangle with the point in it
-    for i in range(len(triangulation)):
-        coords = list(triangulation[i].exterior.coords)[0:3]
-        if p in coords:
-            for j in range(len(coords)):
-                if coords[j] == p:
-                    result.append(
-                        (
-                            p,
-                            coords[(j - 1) % len(coords)],
-                            coords[(j + 1) % len(coords)],
-                        )
-                    )
-                    break
-    return result
+
+    def __init__(self, values: np.ndarray):
+        self._values = values
+        postings: dict[str, list[int]] = {}
+        strings = []
+        for position, value in enumerate(values.tolist()):
+            if not isinstance(value, str):
+                continue
+            strings.append(position)
+            ngrams = {
+                value[start : start + length]
+                for length in range(1, _NGRAM_LENGTH + 1)
+                for start in range(len(value) - length + 1)
+            }
+            for ngram in ngrams:
+                postings.setdefault(ngram, []).append(position)
+        self._postings = {
+            ngram: np.array(positions, dtype=np.int64)
+            for ngram, positions in postings.items()
+        }
+        self._strings = np.array(strings, dtype=np.int64)
+
+    def find(self, substring: str) -> np.ndarray:
+        """Gets the positions of the strings containing substring, in increasing order."""
+        if len(substring) == 0:
+            return self._strings
+        if len(substring) <= _NGRAM_LENGTH:
+            return self._postings.get(substring, _NO_POSITIONS)
+        ngrams = {
+            substring[start : start + _NGRAM_LENGTH]
+            for start in range(len(substring) - _NGRAM_LENGTH + 1)
+        }
+        postings = sorted(
+            (self._postings.get(ngram, _NO_POSITIONS) for ngram in ngrams), key=len
+        )
+        candidates = postings[0]
+        for positions in postings[1:]:
+            if len(candidates) == 0:
+                break
+            candidates = np.intersect1d(candidates, positions, assume_unique=True)
+        return np.array(
+            [p for p in candidates.tolist() if substring in self._values[p]],
+            dtype=np.int64,
+        )
+
+
+class _PrefixIndex:
+    """An index for finding the strings in an array which start with a prefix, by binary search of the sorted
+    strings."""
+
+    def __init__(self, values: np.ndarray):
+        strings = np.flatnonzero([isinstance(value, str) for value in values.tolist()])
+        sorted_values = values[strings].astype(str)
+        order = np.argsort(sorted_values, kind="stable")
+        self._sorted_values = sorted_values[order]
+        self._positions = strings[order]
+
+    def find(self, prefix: str) -> np.ndarray:
+        """Gets the positions of the strings starting with prefix, in increasing order."""
+        start = np.searchsorted(self._sorted_values, prefix, side="left")
+        if len(prefix) == 0:
+            end = len(self._sorted_values)
+        else:
+            # the first string after all those starting with prefix
+            end = np.searchsorted(
+                self._sorted_values, prefix[:-1] + chr(ord(prefix[-1]) + 1), side="left"
+            )
+        return np.sort(self._positions[start:end])
 
 
-def _find_loop(point: Point, triangulation: list[Polygon]):
+def _unit_vectors(lats, lons) -> np.ndarray:
+    """Converts latitudes and longitudes to an (n, 3) array of points on the unit sphere."""
+    lats = np.radians(np.asarray(lats, dtype=np.float64).reshape(-1))
+    lons = np.radians(np.asarray(lons, dtype=np.float64).reshape(-1))
+    cos_lats = np.cos(lats)
+    return np.column_stack(
+        [cos_lats * np.cos(lons), cos_lats * np.sin(lons), np.sin(lats)]
+    )
+
+
+def _coordinate_keys(coords: np.ndarray) -> np.ndarray:
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    return coords[:, 0] + 1j * coords[:, 1]
+
+
+def _group_by_vertex(
+    vertex_ids: np.ndarray, n_vertices: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Group positions in an array of vertex ids by vertex, in a compressed sparse row layout.
+
+    :return: offsets and positions, such that positions[offsets[v]:offsets[v + 1]] are the positions in vertex_ids
+             equal to v, in increasing order
     """
-    Find the loop around the given point formed by all triangles in the triangulation
-    :param point:
-    :param triangulation:
-    :return:
+    offsets = np.zeros(n_vertices + 1, dtype=np.int64)
+    np.cumsum(np.bincount(vertex_ids, minlength=n_vertices), out=offsets[1:])
+    return offsets, np.argsort(vertex_ids, kind="stable")
+
+
+def _find_loop(vertex: int, triangles: np.ndarray) -> list[int]:
+    """
+    Find the loop around the given vertex formed by all triangles with it as a corner
+
+    For a vertex on the outside edge of the triangulation the triangles do not close up into a loop, so the vertex
+    itself is used to close the loop.
+    :param vertex: the index of the vertex to find the loop around
+    :param triangles: (n, 3) array of the corners of all triangles which have the vertex as a corner
+    :return: the vertex indices of the outside edges of the triangles, or an empty list if there are no triangles
     """
-    triangles = _to_triangles(point, triangulation)
     if len(triangles) == 0:
-        raise ValueError("No triangles were found overlapping with point " + str(point))
-    # turn into a map from second point to last point
-    to_next = {y: z for x, y, z in triangles}
-    first_point = triangles[0][1]
-    next_point = triangles[0][2]
-    result = [Point(first_point)]
-    while next_point != first_point:
-        result.append(Point(next_point))
-        next_point = to_next[next_point]
-    return Polygon(result)
-
-
-def _row_to_point(row):
-    return Point(row["longitude"], row["latitude"])
-
-
-def _get_all_node_distances(osmgraph, point) -> dict[int, float]:
-    node: int = osmnx.distance.nearest_nodes(osmgraph, point[0], point[1])
-    node_distances: dict[int, float] = networkx.shortest_path_length(
-        osmgraph, target=node, weight="length"
+        return []
+    # rotate each triangle so the vertex is first, maintaining the cyclical order of the corners
+    position = np.argmax(triangles == vertex, axis=1)
+    rows = np.arange(len(triangles))
+    previous_corners = triangles[rows, (position - 1) % 3].tolist()
+    next_corners = triangles[rows, (position + 1) % 3].tolist()
+    # turn into a map from the corner before the vertex to the corner after it
+    to_next = dict(zip(previous_corners, next_corners))
+    # If some corner is never an after corner then the triangles form a fan on the edge of the triangulation,
+    # so start from the end of the fan
+    open_starts = set(to_next.keys()).difference(to_next.values())
+    if open_starts:
+        next_corner = open_starts.pop()
+        result = []
+        while next_corner in to_next:
+            result.append(next_corner)
+            next_corner = to_next[next_corner]
+        return result + [next_corner, vertex]
+    first_corner = previous_corners[0]
+    next_corner = next_corners[0]
+    result = [first_corner]
+    while next_corner != first_corner:
+        result.append(next_corner)
+        next_corner = to_next[next_corner]
+    return result
+
+
+def _max_distance_m(travel_speed_kmh: float, max_minutes: float = None):
+    if max_minutes is None:
+        return None
+    return 1000 * travel_speed_kmh * max_minutes / 60.0
+
+
+def _build_node_data(
+    nodes: CsrGraph,
+    include: np.ndarray,
+    node_distances: np.ndarray,
+    bucket_distance_m,
+    max_distance_m=None,
+) -> pd.DataFrame:
+    """Build a dataframe with the index, a Point, the distance to the nearest GP surgery, and which bucket it is in
+    for each node.
+
+    :param nodes: the nodes of the graph
+    :param include: a boolean mask of which nodes to include
+    :param node_distances: the distance for each node, as from CsrGraph.shortest_path_lengths
+    :param bucket_distance_m: the distance covered by each bucket
+    :param max_distance_m: optional - the cutoff used for node_distances. Nodes without a distance are given an
+           infinite distance and put in the bucket after the last one a reached node can be in, which covers
+           everywhere past the cutoff even when it isn't a whole number of buckets. Without a cutoff they are left
+           out.
+    """
+    ids = nodes.node_ids[include]
+    xs = nodes.xs[include]
+    ys = nodes.ys[include]
+    dist = node_distances[include]
+    reached = np.isfinite(dist)
+    if max_distance_m is None:
+        ids, xs, ys, dist = ids[reached], xs[reached], ys[reached], dist[reached]
+        bucket_dist = np.floor(dist / bucket_distance_m).astype(np.int64)
+    else:
+        past_cutoff_bucket = math.floor(max_distance_m / bucket_distance_m)
+        if past_cutoff_bucket * bucket_distance_m < max_distance_m:
+            # Reached nodes can be in the bucket the cutoff falls in, so start a new one. When the cutoff is a
+            # whole number of buckets, only nodes exactly at the cutoff are in its bucket, which is shared.
+            past_cutoff_bucket += 1
+        bucket_dist = np.where(
+            reached,
+            np.floor(np.where(reached, dist, 0) / bucket_distance_m),
+            past_cutoff_bucket,
+        ).astype(np.int64)
+    return pd.DataFrame(
+        {
+            "node_index": ids,
+            "point": shapely.points(xs, ys),
+            "dist": dist,
+            "bucket_dist": bucket_dist,
+        }
     )
-    return node_distances
 
 
 def _join_distances_to_polygons(node_data, limit: Polygon):
@@ -398,34 +920,57 @@ def _join_distances_to_polygons(node_data, limit: Polygon):
     if len(unique_buckets) == 1:
         return _single_bucket_polygon(limit, unique_buckets[0])
 
-    # Calculate the little voronoi area around each node
-    voronoi = shapely.ops.voronoi_diagram(MultiPoint(node_data["point"].values))
-    # trim it so they add up to the original area
-    trimmed = [poly.intersection(limit) for poly in voronoi.geoms]
-    # Unfortunately voronoi does not keep the output ordering. So we have to (inefficiently)
-    # iterate over the nodes to re-order
-    diagram = STRtree(trimmed)
-    ordered = [diagram.nearest(point) for point in node_data["point"]]
-    node_data["area"] = ordered
-    geovoronoi = gpd.GeoDataFrame(node_data, geometry="area")
-    # dissolve them down to grouped polygons
-    result = geovoronoi[["bucket_dist", "area"]].dissolve(by="bucket_dist")
-    # Unfortunately geovoronoi isn't consistent about whether it returns MultiPolygons or Polygons,
+    points = node_data["point"].values
+    # Calculate the little voronoi area around each node, covering all of the limit
+    cells = shapely.get_parts(
+        shapely.voronoi_polygons(shapely.multipoints(points), extend_to=limit)
+    )
+    # Unfortunately voronoi does not keep the input ordering. Each node is inside its own cell, so match them up
+    # with a single bulk query. Nodes at the same location share a cell.
+    point_index, cell_index = STRtree(cells).query(points, predicate="within")
+    node_cells = np.empty(len(points), dtype=object)
+    node_cells[point_index] = cells[cell_index]
+
+    # dissolve them down to grouped polygons, then trim each group so they add up to the original area
+    buckets = node_data["bucket_dist"].to_numpy()
+    order = np.argsort(buckets, kind="stable")
+    group_buckets, group_starts = np.unique(buckets[order], return_index=True)
+    shapely.prepare(limit)
+    areas = []
+    for group in np.split(order, group_starts[1:]):
+        if len(group) == 1:
+            area = node_cells[group[0]]
+        else:
+            area = shapely.union_all(node_cells[group])
+        areas.append(_polygonal(shapely.intersection(area, limit)))
+    # Unfortunately the union isn't consistent about whether it returns MultiPolygons or Polygons,
     # so normalize to MultiPolygons
-    result = result.assign(
-        mp=result["area"].apply(
-            lambda p: p if isinstance(p, MultiPolygon) else MultiPolygon([p])
-        )
+    mps = [p if isinstance(p, MultiPolygon) else MultiPolygon([p]) for p in areas]
+    data = pd.DataFrame(
+        {"area": areas, "mp": mps},
+        index=pd.Index(group_buckets, name="bucket_dist"),
     )
-    result.set_geometry("mp")
-    return result
+    return gpd.GeoDataFrame(data, geometry="mp")
+
+
+def _polygonal(geometry):
+    """Drop any lines or points left over from an intersection, keeping the Polygon or MultiPolygon."""
+    if isinstance(geometry, (Polygon, MultiPolygon)):
+        return geometry
+    polygons = [
+        part
+        for part in shapely.get_parts(geometry)
+        if isinstance(part, (Polygon, MultiPolygon))
+    ]
+    return shapely.union_all(polygons) if polygons else MultiPolygon()
 
 
 def _single_bucket_polygon(poly, bucket_dist):
     # if you aren't careful, DataFrame is too clever, and unwraps a MultiPolygon to a Polygon
     # so construct with columns, then fill with loc
     mp = MultiPolygon([poly])
-    data = pd.DataFrame([{"area": poly, "mp": mp}])
-    data.index.name = "bucket_dist"
+    data = pd.DataFrame(
+        [{"area": poly, "mp": mp}], index=pd.Index([bucket_dist], name="bucket_dist")
+    )
     result = gpd.GeoDataFrame(data, geometry="mp")
     return result
@@ -0,0 +1,111 @@
+import json
+from typing import Generator, Iterable
+
+import geojson
+
+# The least text to read from the source at a time
+_MIN_READ = 1 << 16
+
+
+def iter_feature_collection(text_chunks: Iterable[str]) -> Generator:
+    """
+    Parses a GeoJSON FeatureCollection from consecutive pieces of its text, yielding each feature as soon as all
+    of it has been read, so the whole collection is never held in memory.
+
+    Features are parsed as geojson.loads parses them. The other members of the collection, which can come before or
+    after the features, are returned when the generator finishes, as the value of the StopIteration or of a
+    yield from.
+
+    Args:
+        text_chunks: The text of the collection, in pieces of any size
+    Yields:
+        each feature in the collection
+    Returns:
+        dictionary of the other members of the collection, with "features" as an empty list if the collection
+        had any
+    Raises:
+        ValueError: if the text isn't a JSON object, or is cut short
+    """
+    reader = _Reader(text_chunks)
+    members = {}
+    reader.expect("{")
+    if reader.peek() == "}":
+        return members
+    while True:
+        key = reader.decode()
+        reader.expect(":")
+        if key == "features":
+            members["features"] = []
+            reader.expect("[")
+            if reader.peek() == "]":
+                reader.expect("]")
+            else:
+                while True:
+                    yield reader.decode()
+                    if reader.expect(",", "]") == "]":
+                        break
+        else:
+            members[key] = reader.decode()
+        if reader.expect(",", "}") == "}":
+            return members
+
+
+class _Reader:
+    """Reads JSON values from text which arrives in pieces, keeping only the text not yet parsed."""
+
+    def __init__(self, text_chunks: Iterable[str]):
+        self._chunks = iter(text_chunks)
+        self._decoder = json.JSONDecoder(object_hook=geojson.GeoJSON.to_instance)
+        self._text = ""
+        self._pos = 0
+        self._done = False
+
+    def peek(self) -> str:
+        """Skips whitespace, and gets the next character without using it, or "" at the end of the text."""
+        while True:
+            while self._pos < len(self._text) and self._text[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._text) or self._done:
+                return self._text[self._pos : self._pos + 1]
+            self._read_more()
+
+    def expect(self, *characters: str) -> str:
+        """Skips whitespace, and uses the next character, which must be one of characters."""
+        character = self.peek()
+        if character == "" or character not in characters:
+            raise ValueError(
+                f"Expected one of {characters} in GeoJSON, not {character or 'the end'}"
+            )
+        self._pos += 1
+        return character
+
+    def decode(self):
+        """Skips whitespace, and parses the next JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._text, self._pos)
+                # A value at the very end of the text may be cut short, such as a number, unless it is the end
+                if end < len(self._text) or self._done:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._done:
+                    raise
+            self._read_more()
+
+    def _read_more(self):
+        # Read at least as much again as there is left to parse, so a value split across many pieces is only
+        # parsed again a few times
+        parts = [self._text[self._pos :]]
+        wanted = max(len(parts[0]), _MIN_READ)
+        read = 0
+        while read < wanted:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._done = True
+                break
+            parts.append(chunk)
+            read += len(chunk)
+        self._text = "".join(parts)
+        self._pos = 0
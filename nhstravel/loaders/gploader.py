@@ -1,5 +1,9 @@
+import json
+
 import pandas as pd
 
+from nhstravel.storage import file_digest
+
 
 def load(gp_data_path="data/gp_data.csv"):
     return pd.read_csv(gp_data_path)
@@ -35,3 +39,19 @@ def load_england(
     if only_active:
         df = df[df["Status Code"].isin(["A"])]
     return df
+
+
+def load_england_hash(
+    gp_data_path="data/gp_data.csv",
+    only_england_grouping=True,
+    only_gp=True,
+    only_active=True,
+) -> str:
+    """
+    Hash the inputs of load_england, so anything built from its result can be checked as still up to date.
+    The arguments are as for load_england.
+    :return: a hex sha256 digest of the content of the GP data file and the filter flags
+    """
+    digest = file_digest(gp_data_path)
+    digest.update(json.dumps([only_england_grouping, only_gp, only_active]).encode())
+    return digest.hexdigest()
@@ -1,11 +1,25 @@
+import numpy as np
 import pandas as pd
-import urllib.request
+import geopandas as gpd
 import geojson
-import copy
+import shapely
+from concurrent.futures import ThreadPoolExecutor
+import codecs
+import contextlib
+import itertools
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pandas.io.parsers.readers import TextFileReader
 from pandas import DataFrame
 import os
 
+from nhstravel.loaders.geojsonstream import iter_feature_collection
+from nhstravel.loaders.lsoashapefile import LsoaShapefile
+from nhstravel.loaders.postcodeindex import PostcodeIndex
+from nhstravel.loaders.responsecache import ResponseCache
+from nhstravel.loaders.typedcache import read_typed_cache
+
 # LSOA data set locations
 data_path = os.path.dirname(__file__) + "/../../data"
 lsoa_definitions_data_path = (
@@ -13,6 +27,14 @@ lsoa_definitions_data_path = (
 )
 lsoa_population_data_path = data_path + "/lsoa_global_number_residents_2021.csv"
 lsoa_postcode_map_data_path = data_path + "/pcd_lsoa21cd_nov22_en.csv"
+# ArcGIS FeatureServer query endpoint for the LSOA boundaries, obtained via
+# https://geoportal.statistics.gov.uk/datasets/ons::lsoa-dec-2021-boundaries-full-clipped-ew-bfc/about
+lsoa_boundaries_query_url = "https://services1.arcgis.com/ESMARspQHYMw9BZ9/arcgis/rest/services/LSOA_Dec_2021_Boundaries_Full_Clipped_EW_BFC_2022/FeatureServer/0/query"
+# Local shapefile of the generalised LSOA boundaries, from
+# https://geoportal.statistics.gov.uk/datasets/ons::lsoa-dec-2021-boundaries-generalised-clipped-ew-bgc/about
+lsoa_boundaries_shapefile_path = data_path + "/LSOA_2021_EW_BGC.shp"
+# How much of a boundaries response to read at a time when streaming it
+_STREAM_CHUNK_SIZE = 1 << 16
 
 
 class LsoaLoader:
@@ -28,6 +50,17 @@ class LsoaLoader:
         population_code_col_number: int = 1,
         population_name_col_number: int = 0,
         population_population_col_number: int = 2,
+        boundaries_query_url: str = lsoa_boundaries_query_url,
+        fetch_max_workers: int = 4,
+        fetch_retries: int = 3,
+        fetch_backoff_factor: float = 0.5,
+        fetch_timeout: float = 60.0,
+        fetch_page_size: int = 2000,
+        cache_dir: str = None,
+        cache_max_bytes: int = 1 << 30,
+        offline: bool = False,
+        boundaries_shapefile_path: str = None,
+        typed_cache_dir: str = None,
     ):
         """
         Create a loader which will load data about LSOAs from commonly provided CSV formats.
@@ -44,6 +77,27 @@ class LsoaLoader:
             population_code_col_number: Column number in the CSV containing LSOA code
             population_name_col_number: Column number in the CSV containing LSOA name
             population_population_col_number: Column number in the CSV containing the population estimates
+            boundaries_query_url: The ArcGIS FeatureServer query URL to load LSOA boundaries from
+            fetch_max_workers: How many chunks of LSOA boundaries to fetch at the same time. The connections are kept
+                open and reused between chunks.
+            fetch_retries: How many times to retry fetching a chunk after a connection error or a throttling or
+                server error response
+            fetch_backoff_factor: The wait before each retry, doubling each time, starting from this many seconds
+            fetch_timeout: How many seconds to wait for the server when fetching a chunk
+            fetch_page_size: The most LSOA boundaries to ask the server for in one request. Larger ranges of
+                object ids are split into chunks of this size.
+            cache_dir: A directory to cache LSOA boundary responses in, so the same query is only fetched once.
+                If None, nothing is cached.
+            cache_max_bytes: The most space the cached responses can take up, before the least recently used
+                are deleted
+            offline: Only use cached LSOA boundary responses, and never fetch from the server. Loading boundaries
+                which aren't in the cache_dir raises a ValueError.
+            boundaries_shapefile_path: A local shapefile to load LSOA boundaries from instead of the FeatureServer,
+                such as lsoa_boundaries_shapefile_path. Only the requested LSOAs are read from it, using an index
+                kept alongside the file, which is built the first time it is used.
+            typed_cache_dir: The directory to keep typed Arrow copies of the definitions and population CSV files
+                in, defaulting to the directory of each CSV file. Each CSV is only parsed the first time it is read,
+                or when it changes.
         """
         data_path = os.path.dirname(__file__) + "/../../data"
         if definitions_data_path is not None:
@@ -73,51 +127,109 @@ class LsoaLoader:
         self.lsoa_code_col = "LSOA21CD"
         self.lsoa_name_col = "LSOA21NM"
         self.lsoa_population_col = "all ages"
+        # Fetching LSOA boundaries
+        self.boundaries_query_url = boundaries_query_url
+        self.fetch_max_workers = fetch_max_workers
+        self.fetch_retries = fetch_retries
+        self.fetch_backoff_factor = fetch_backoff_factor
+        self.fetch_timeout = fetch_timeout
+        self.fetch_page_size = fetch_page_size
+        self.cache = (
+            ResponseCache(cache_dir, cache_max_bytes) if cache_dir is not None else None
+        )
+        self.offline = offline
+        self.boundaries_shapefile_path = boundaries_shapefile_path
+        self._boundaries_shapefile = None
+        self.typed_cache_dir = typed_cache_dir
+        # The national frames and indexes of their names, read when first needed and kept for later areas
+        self._lsoa_objects = None
+        self._population_estimates = None
+        self._lsoas_with_population = None
 
-    def read_lsoa_objects_england(self) -> TextFileReader:
+    def read_lsoa_objects_england(self, columns: list = None) -> DataFrame:
         """
         Reads the CSV file with lsoa data definitions.
 
+        The CSV is parsed once, and kept as a typed Arrow file in the typed_cache_dir for reading next time.
+
+        Args:
+            columns: The columns to read, or None for all of them
         Returns:
-            Text file reader object which can be passed to pandas to create data frame
-            or can be manipulated directly.
+            Pandas dataframe with an integer object id column, and string code, name and global id columns
         """
-        global_lsoa_pd = pd.read_csv(
+        usecols = [
+            self.defs_object_id_col_number,
+            self.defs_code_col_number,
+            self.defs_name_col_number,
+            self.defs_global_id_col_number,
+        ]
+
+        def read_csv() -> DataFrame:
+            global_lsoa_pd = pd.read_csv(
+                self.definitions_data_path,
+                header=0,
+                usecols=usecols,
+                dtype="string",
+            )
+            return global_lsoa_pd.astype({self.lsoa_object_id_col: np.int64})
+
+        return read_typed_cache(
             self.definitions_data_path,
-            header=0,
-            usecols=[
-                self.defs_object_id_col_number,
-                self.defs_code_col_number,
-                self.defs_name_col_number,
-                self.defs_global_id_col_number,
-            ],
-            dtype="string",
+            read_csv,
+            settings={"usecols": usecols},
+            columns=columns,
+            cache_dir=self.typed_cache_dir,
         )
-        return global_lsoa_pd
 
-    def read_lsoa_population_estimates_england(self) -> TextFileReader:
+    def read_lsoa_population_estimates_england(self, columns: list = None) -> DataFrame:
         """
         Read the CSV file with population figures from each LSOA.
 
+        The CSV is parsed once, and kept as a typed Arrow file in the typed_cache_dir for reading next time.
+
+        Args:
+            columns: The columns to read, or None for all of them
         Returns:
-            Text file reader object with can be passed to pandas to create data frame
-            or can be manipulated directly
+            Pandas dataframe with string name and code columns and an integer population column
         """
-        global_lsoa_population_estimates_2021_pd = pd.read_csv(
+        usecols = [
+            self.population_code_col_number,
+            self.population_name_col_number,
+            self.population_population_col_number,
+        ]
+
+        def read_csv() -> DataFrame:
+            global_lsoa_population_estimates_2021_pd = pd.read_csv(
+                self.population_data_path,
+                header=0,
+                skiprows=self.population_skip_rows,
+                usecols=usecols,
+                names=[
+                    self.lsoa_name_col,
+                    self.lsoa_code_col,
+                    self.lsoa_population_col,
+                ],
+                dtype="string",
+            )
+            # Drop the notes at the end of the file, which have no population
+            global_lsoa_population_estimates_2021_pd.dropna(
+                subset=[self.lsoa_population_col], inplace=True
+            )
+            global_lsoa_population_estimates_2021_pd[self.lsoa_population_col] = (
+                global_lsoa_population_estimates_2021_pd[self.lsoa_population_col]
+                .str.replace(",", "")
+                .astype(np.int64)
+            )
+            return global_lsoa_population_estimates_2021_pd
+
+        return read_typed_cache(
             self.population_data_path,
-            header=0,
-            skiprows=self.population_skip_rows,
-            usecols=[
-                self.population_code_col_number,
-                self.population_name_col_number,
-                self.population_population_col_number,
-            ],
-            names=[self.lsoa_name_col, self.lsoa_code_col, self.lsoa_population_col],
-            dtype="string",
+            read_csv,
+            settings={"skiprows": self.population_skip_rows, "usecols": usecols},
+            columns=columns,
+            cache_dir=self.typed_cache_dir,
         )
 
-        return global_lsoa_population_estimates_2021_pd
-
     def load_lsoa_objects_for_area_england(
         self, area: str, global_lsoa: TextFileReader = None
     ) -> DataFrame:
@@ -135,11 +247,12 @@ class LsoaLoader:
             Pandas dataframe with loaded LSOAs
         """
         if global_lsoa is None:
-            global_lsoa = self.read_lsoa_objects_england()
+            global_lsoa, name_index = self._get_lsoa_objects()
+            area_lsoa = global_lsoa.iloc[name_index.find(area)]
+        else:
+            area_lsoa = global_lsoa[global_lsoa[self.lsoa_name_col].str.contains(area)]
 
-        area_lsoa_pd = DataFrame(
-            global_lsoa[global_lsoa[self.lsoa_name_col].str.contains(area)]
-        )
+        area_lsoa_pd = _with_python_strings(area_lsoa)
         area_lsoa_pd.reset_index(drop=True, inplace=True)
         area_lsoa_pd[self.lsoa_object_id_col] = area_lsoa_pd[
             self.lsoa_object_id_col
@@ -165,21 +278,29 @@ class LsoaLoader:
             Pandas dataframe with loaded LSOAs and population
         """
         if global_lsoa_population_estimates is None:
-            global_lsoa_population_estimates = (
-                self.read_lsoa_population_estimates_england()
-            )
-
-        lsoa_population_estimates_pd = DataFrame(
-            global_lsoa_population_estimates[
+            (
+                global_lsoa_population_estimates,
+                name_index,
+            ) = self._get_population_estimates()
+            area_population_estimates = global_lsoa_population_estimates.iloc[
+                name_index.find(area)
+            ]
+        else:
+            area_population_estimates = global_lsoa_population_estimates[
                 global_lsoa_population_estimates[self.lsoa_name_col].str.contains(area)
             ]
-        )
+
+        lsoa_population_estimates_pd = _with_python_strings(area_population_estimates)
         lsoa_population_estimates_pd.reset_index(drop=True, inplace=True)
-        lsoa_population_estimates_pd[self.lsoa_population_col] = (
+        # The population is already an integer when read from the typed cache, but not from a plain CSV
+        if not pd.api.types.is_integer_dtype(
             lsoa_population_estimates_pd[self.lsoa_population_col]
-            .str.replace(",", "")
-            .astype(int)
-        )
+        ):
+            lsoa_population_estimates_pd[self.lsoa_population_col] = (
+                lsoa_population_estimates_pd[self.lsoa_population_col]
+                .str.replace(",", "")
+                .astype(int)
+            )
 
         return lsoa_population_estimates_pd
 
@@ -197,83 +318,743 @@ class LsoaLoader:
         Returns:
              Pandas dataframe with loaded LSOAs and population
         """
-        lsoa_df = self.load_lsoa_objects_for_area_england(area)
-        lsoa_population_df = self.load_lsoa_population_estimates_england(area)
-        # Dropping the duplicate column before the merge
-        lsoa_population_df.drop(columns=[self.lsoa_name_col], inplace=True)
+        return self.build_lsoa_data_frame_for_areas([area])[area]
 
-        lsoa_with_population_pd = pd.merge(
-            lsoa_df,
-            lsoa_population_df,
-            left_on=self.lsoa_code_col,
-            right_on=self.lsoa_code_col,
-        )
-        lsoa_with_population_pd[self.lsoa_object_id_col] = lsoa_with_population_pd[
-            self.lsoa_object_id_col
-        ].astype(str)
+    def build_lsoa_data_frame_for_areas(self, areas: list) -> dict:
+        """
+        Builds data frames containing information about LSOA and population for each of several areas in England,
+        as build_lsoa_data_frame_for_area_england does for one.
 
-        return lsoa_with_population_pd
+        The national LSOA and population frames are read, merged and indexed by name once, so each area is then
+        just a lookup in the index.
+
+        Args:
+            areas:
+                The names or partial names for the areas to be returned, matched as for
+                build_lsoa_data_frame_for_area_england
+
+        Returns:
+             dictionary of Pandas dataframes with loaded LSOAs and population, keyed by area
+        """
+        lsoa_objects, lsoa_name_index = self._get_lsoa_objects()
+        population_estimates, population_name_index = self._get_population_estimates()
+        (
+            lsoas_with_population,
+            object_rows,
+            population_rows,
+        ) = self._get_lsoas_with_population()
+
+        area_frames = {}
+        for area in areas:
+            # An LSOA is in the area if its name matches in both the definitions and the population estimates
+            in_area_objects = np.zeros(len(lsoa_objects.index), dtype=bool)
+            in_area_objects[lsoa_name_index.find(area)] = True
+            in_area_population = np.zeros(len(population_estimates.index), dtype=bool)
+            in_area_population[population_name_index.find(area)] = True
+            rows = np.flatnonzero(
+                in_area_objects[object_rows] & in_area_population[population_rows]
+            )
+            area_frames[area] = lsoas_with_population.iloc[rows].reset_index(drop=True)
+        return area_frames
+
+    def _get_lsoa_objects(self) -> tuple:
+        """Gets the national LSOA definitions and an index of their names, reading them the first time."""
+        if self._lsoa_objects is None:
+            lsoa_objects = self.read_lsoa_objects_england()
+            self._lsoa_objects = (
+                lsoa_objects,
+                _LsoaNameIndex(lsoa_objects[self.lsoa_name_col]),
+            )
+        return self._lsoa_objects
+
+    def _get_population_estimates(self) -> tuple:
+        """Gets the national LSOA population estimates and an index of their names, reading them the first time."""
+        if self._population_estimates is None:
+            population_estimates = self.read_lsoa_population_estimates_england()
+            self._population_estimates = (
+                population_estimates,
+                _LsoaNameIndex(population_estimates[self.lsoa_name_col]),
+            )
+        return self._population_estimates
+
+    def _get_lsoas_with_population(self) -> tuple:
+        """
+        Gets the national LSOA definitions merged with their population estimates, with the same columns and types
+        as build_lsoa_data_frame_for_area_england gives, merging them the first time.
+
+        Returns:
+            the merged data frame, and for each of its rows, the row it came from in the definitions and in the
+            population estimates
+        """
+        if self._lsoas_with_population is None:
+            lsoa_objects, _ = self._get_lsoa_objects()
+            population_estimates, _ = self._get_population_estimates()
+            lsoa_df = _with_python_strings(lsoa_objects)
+            lsoa_df[self.lsoa_code_col] = lsoa_df[self.lsoa_code_col].astype(str)
+            lsoa_df["_object_row"] = np.arange(len(lsoa_df.index))
+            lsoa_population_df = population_estimates[
+                [self.lsoa_code_col, self.lsoa_population_col]
+            ].astype({self.lsoa_code_col: str})
+            lsoa_population_df["_population_row"] = np.arange(
+                len(lsoa_population_df.index)
+            )
+
+            lsoa_with_population_pd = pd.merge(
+                lsoa_df,
+                lsoa_population_df,
+                left_on=self.lsoa_code_col,
+                right_on=self.lsoa_code_col,
+            )
+            lsoa_with_population_pd[self.lsoa_object_id_col] = lsoa_with_population_pd[
+                self.lsoa_object_id_col
+            ].astype(str)
+            object_rows = lsoa_with_population_pd.pop("_object_row").to_numpy()
+            population_rows = lsoa_with_population_pd.pop("_population_row").to_numpy()
+            self._lsoas_with_population = (
+                lsoa_with_population_pd,
+                object_rows,
+                population_rows,
+            )
+        return self._lsoas_with_population
 
     def load_geo_json_shapefiles_for_lsoas(
-        self, lsoas: DataFrame, area: str = None
+        self,
+        lsoas: DataFrame,
+        area: str = None,
+        out_fields: list = None,
+        max_allowable_offset: float = None,
+        geometry_precision: int = None,
     ) -> dict:
         """
         Loads geojson shape files for provided lsoas.
 
         Args:
             lsoas:
-                Pandas dataframe containing object ids for all lsoas to load
+                Pandas dataframe containing object ids for all lsoas to load, or their codes when loading
+                from the boundaries_shapefile_path
             area:
                 Area to filter lsoas by. The loading method split object ids
                 to chunks to allow faster loading and prevent throttling from
                 the geoportal. This means that it can load lsoas for areas
                 outside of the area of interest. Providing area will ensure
                 lsoas will be filtered by the area and only those will be returned.
+            out_fields:
+                The boundary properties to load, or None for all of them. The object id (if there is one)
+                and LSOA code are always loaded.
+            max_allowable_offset:
+                If given, the server simplifies the boundaries so they are at most this far (in degrees)
+                from the full detail boundaries, making the download much smaller
+            geometry_precision:
+                If given, the number of decimal places to give boundary coordinates to
         Returns:
             dictionary of all lsoas geojson keyed by the lsoa code
         """
-        # Create split of objects to chunks
-        object_ids_chunks = [[]]
-        prev_objid = lsoas[self.lsoa_object_id_col].min()
-        for _, row in lsoas.iterrows():
-            current_objid = row[self.lsoa_object_id_col]
-            if int(current_objid) - int(prev_objid) > 1:
-                object_ids_chunks.append([])
-            object_ids_chunks[-1].append(current_objid)
-            prev_objid = current_objid
-
-        # Load the LSOA geofiles from the arcgis and merge into one geogson file for processing
-        # obtained via
-        # https://geoportal.statistics.gov.uk/datasets/ons::lsoa-dec-2021-boundaries-full-clipped-ew-bfc/about
-        lsoa_shapefile = None
-        for chunk in object_ids_chunks:
-            geo_json_url_link = f"https://services1.arcgis.com/ESMARspQHYMw9BZ9/arcgis/rest/services/LSOA_Dec_2021_Boundaries_Full_Clipped_EW_BFC_2022/FeatureServer/0/query?where=OBJECTID>={chunk[0]}%20AND%20OBJECTID<={chunk[-1]}&outFields=*&outSR=4326&f=geojson"
-            lsoa_shapefile_r = urllib.request.urlopen(geo_json_url_link)
-            lsoa_shapefile_all = geojson.loads(lsoa_shapefile_r.read())
-            if lsoa_shapefile is not None:
-                lsoa_shapefile["features"] = (
-                    lsoa_shapefile_all["features"] + lsoa_shapefile["features"]
-                )
-            else:
-                lsoa_shapefile = lsoa_shapefile_all
+        if len(lsoas.index) == 0:
+            return geojson.FeatureCollection([])
+        if self.boundaries_shapefile_path is not None:
+            lsoa_shapefile = self._read_geo_json(
+                self._get_boundaries_shapefile().read_codes(
+                    lsoas[self.lsoa_code_col].to_numpy(dtype=str)
+                ),
+                out_fields,
+                max_allowable_offset,
+                geometry_precision,
+            )
+        else:
+            lsoa_shapefile = self._fetch_geo_json_for_object_ids(
+                lsoas[self.lsoa_object_id_col].astype(int).to_numpy(),
+                out_fields,
+                max_allowable_offset,
+                geometry_precision,
+            )
 
         # Return all loaded LSOAs if no further filtering is requested
-        remapped_lsoa = copy.deepcopy(lsoa_shapefile)
         if area is None or area.strip() == "":
-            return remapped_lsoa
+            return lsoa_shapefile
 
         # Filter LSOAs from area only
         # Loading by OBJECTID could bring additional objects not in the area
-        remapped_lsoa["features"] = []
-        for feature in lsoa_shapefile["features"]:
-            row_json = lsoas.loc[
-                lsoas[self.lsoa_code_col] == feature["properties"][self.lsoa_code_col]
-            ].to_dict(orient="records")
-            if len(row_json):
-                feature["properties"] = {**feature["properties"], **row_json[0]}
-                remapped_lsoa["features"].append(copy.deepcopy(feature))
+        rows_by_code = self._rows_by_code(lsoas)
+        lsoa_shapefile["features"] = [
+            feature
+            for feature in lsoa_shapefile["features"]
+            if self._join_area_row(feature, rows_by_code)
+        ]
+
+        return lsoa_shapefile
+
+    def load_geo_json_shapefiles_in_bbox(
+        self,
+        min_lon: float,
+        min_lat: float,
+        max_lon: float,
+        max_lat: float,
+        out_fields: list = None,
+        max_allowable_offset: float = None,
+        geometry_precision: int = None,
+    ) -> dict:
+        """
+        Loads geojson shape files for the LSOAs in a bounding box, from the boundaries_shapefile_path.
+
+        Args:
+            min_lon: Western edge of the box
+            min_lat: Southern edge of the box
+            max_lon: Eastern edge of the box
+            max_lat: Northern edge of the box
+            out_fields: The boundary properties to load, or None for all of them. The LSOA code is always loaded.
+            max_allowable_offset: If given, the boundaries are simplified so they are at most this far (in degrees)
+                from the full detail boundaries
+            geometry_precision: If given, the number of decimal places to give boundary coordinates to
+        Returns:
+            geojson feature collection of the LSOAs whose bounding boxes overlap the box. This can include LSOAs
+            near the box which don't quite touch it.
+        """
+        if self.boundaries_shapefile_path is None:
+            raise ValueError(
+                "Loading LSOA boundaries by bounding box needs a boundaries_shapefile_path"
+            )
+        return self._read_geo_json(
+            self._get_boundaries_shapefile().read_bbox(
+                min_lon, min_lat, max_lon, max_lat
+            ),
+            out_fields,
+            max_allowable_offset,
+            geometry_precision,
+        )
+
+    def _get_boundaries_shapefile(self) -> LsoaShapefile:
+        """Opens the boundaries shapefile on first use, as that reads or builds its index."""
+        if self._boundaries_shapefile is None:
+            self._boundaries_shapefile = LsoaShapefile(
+                self.boundaries_shapefile_path, code_col=self.lsoa_code_col
+            )
+        return self._boundaries_shapefile
+
+    def _read_geo_json(
+        self,
+        boundaries: gpd.GeoDataFrame,
+        out_fields: list,
+        max_allowable_offset: float,
+        geometry_precision: int,
+    ) -> dict:
+        """
+        Converts boundaries read from the shapefile to a geojson feature collection, in the same form as the
+        FeatureServer gives, applying the same options.
+        """
+        boundaries = self._reduce_boundaries(
+            boundaries, out_fields, max_allowable_offset, geometry_precision
+        )
+        return geojson.loads(boundaries.to_json(drop_id=True))
+
+    def _reduce_boundaries(
+        self,
+        boundaries: gpd.GeoDataFrame,
+        out_fields: list,
+        max_allowable_offset: float,
+        geometry_precision: int,
+    ) -> gpd.GeoDataFrame:
+        """Applies the FeatureServer options for reducing the payload to boundaries read from the shapefile."""
+        if out_fields is not None:
+            fields = [self.lsoa_code_col] + [
+                field
+                for field in out_fields
+                if field != self.lsoa_code_col and field in boundaries.columns
+            ]
+            boundaries = boundaries[fields + ["geometry"]]
+        geometry = boundaries.geometry.to_numpy()
+        if max_allowable_offset is not None:
+            geometry = shapely.simplify(geometry, max_allowable_offset)
+        if geometry_precision is not None:
+            geometry = shapely.transform(
+                geometry, lambda coords: np.round(coords, geometry_precision)
+            )
+        return boundaries.set_geometry(
+            gpd.GeoSeries(geometry, index=boundaries.index, crs=boundaries.crs)
+        )
+
+    def build_lsoa_geo_data_frame_for_area_england(
+        self,
+        area: str,
+        out_fields: list = None,
+        max_allowable_offset: float = None,
+        geometry_precision: int = None,
+    ) -> gpd.GeoDataFrame:
+        """
+        Builds a GeoDataFrame of the LSOAs in an area in England, with their population and boundaries, for
+        working on the boundaries with vectorised geometry operations rather than geojson feature by feature.
+
+        The boundaries are loaded as for load_geo_json_shapefiles_for_lsoas, and their geometries are built once.
+        The spatial index is built too, so bulk spatial predicates such as
+        gdf.sindex.query(polygon, predicate="intersects") can be run straight away.
+
+        Args:
+            area:
+                The name or partial name for the area, matched as for build_lsoa_data_frame_for_area_england
+            out_fields:
+                The boundary properties to load, or None for all of them, as for load_geo_json_shapefiles_for_lsoas
+            max_allowable_offset:
+                If given, how far (in degrees) the boundaries can be simplified by
+            geometry_precision:
+                If given, the number of decimal places to give boundary coordinates to
+
+        Returns:
+            GeoDataFrame with the columns of build_lsoa_data_frame_for_area_england, followed by any other boundary
+            properties and the geometry, in latitude and longitude (EPSG:4326). LSOAs without a boundary are left
+            out.
+        """
+        lsoas = self.build_lsoa_data_frame_for_area_england(area)
+        if len(lsoas.index) == 0:
+            boundaries = gpd.GeoDataFrame(
+                {self.lsoa_code_col: []}, geometry=[], crs="EPSG:4326"
+            )
+        elif self.boundaries_shapefile_path is not None:
+            # Use the shapefile geometries as read, rather than going through geojson
+            boundaries = self._reduce_boundaries(
+                self._get_boundaries_shapefile().read_codes(
+                    lsoas[self.lsoa_code_col].to_numpy(dtype=str)
+                ),
+                out_fields,
+                max_allowable_offset,
+                geometry_precision,
+            )
+        else:
+            boundaries = gpd.GeoDataFrame.from_features(
+                self.load_geo_json_shapefiles_for_lsoas(
+                    lsoas,
+                    out_fields=out_fields,
+                    max_allowable_offset=max_allowable_offset,
+                    geometry_precision=geometry_precision,
+                ),
+                crs="EPSG:4326",
+            )
+        # Keep the columns from the area frame where the boundaries have them too, such as the object id
+        boundaries = boundaries.drop(
+            columns=[
+                column
+                for column in lsoas.columns
+                if column != self.lsoa_code_col and column in boundaries.columns
+            ]
+        )
+        lsoa_gdf = gpd.GeoDataFrame(
+            lsoas.merge(boundaries, on=self.lsoa_code_col),
+            geometry=boundaries.geometry.name,
+            crs=boundaries.crs,
+        )
+        # Build the spatial index now, so it is only built once however the frame is used
+        lsoa_gdf.sindex
+        return lsoa_gdf
+
+    def iter_geo_json_features_for_lsoas(
+        self,
+        lsoas: DataFrame,
+        area: str = None,
+        out_fields: list = None,
+        max_allowable_offset: float = None,
+        geometry_precision: int = None,
+    ):
+        """
+        Loads the geojson features for provided lsoas one at a time, as load_geo_json_shapefiles_for_lsoas does
+        all at once, for loads too big to hold as one collection.
+
+        Each response is parsed as it arrives, and its features are yielded as soon as they are read, so only one
+        feature and one piece of a response are held at a time. The chunks of object ids are fetched one after
+        another over one kept alive connection, rather than several at a time. Cached responses are read from
+        the cache a piece at a time too, and fetched responses are written to it as they arrive.
+
+        Args:
+            lsoas: Pandas dataframe containing object ids for all lsoas to load, or their codes when loading from
+                the boundaries_shapefile_path
+            area: As for load_geo_json_shapefiles_for_lsoas, filter the features to the lsoas provided and
+                add their columns to the feature properties
+            out_fields: The boundary properties to load, or None for all of them
+            max_allowable_offset: If given, how far (in degrees) the boundaries can be simplified by
+            geometry_precision: If given, the number of decimal places to give boundary coordinates to
+        Yields:
+            each geojson feature
+        """
+        if len(lsoas.index) == 0:
+            return
+        rows_by_code = None
+        if area is not None and area.strip() != "":
+            rows_by_code = self._rows_by_code(lsoas)
+        if self.boundaries_shapefile_path is not None:
+            features = self._iter_shapefile_features(
+                lsoas[self.lsoa_code_col].to_numpy(dtype=str),
+                out_fields,
+                max_allowable_offset,
+                geometry_precision,
+            )
+        else:
+            features = self._iter_fetched_features(
+                lsoas[self.lsoa_object_id_col].astype(int).to_numpy(),
+                self._boundaries_query(
+                    out_fields, max_allowable_offset, geometry_precision
+                ),
+            )
+        for feature in features:
+            if rows_by_code is None or self._join_area_row(feature, rows_by_code):
+                yield feature
+
+    def _rows_by_code(self, lsoas: DataFrame) -> dict:
+        """Gets the first row of lsoas with each LSOA code, as a dict of the row keyed by code."""
+        rows_by_code = {}
+        for row in lsoas.to_dict(orient="records"):
+            rows_by_code.setdefault(row[self.lsoa_code_col], row)
+        return rows_by_code
+
+    def _join_area_row(self, feature: dict, rows_by_code: dict) -> bool:
+        """
+        Adds the columns of the row of lsoas for a feature to its properties. Features are parsed just for each
+        load, so are updated in place rather than copied.
+
+        Returns:
+            whether there was a row for the feature
+        """
+        row = rows_by_code.get(feature["properties"][self.lsoa_code_col])
+        if row is None:
+            return False
+        feature["properties"] = {**feature["properties"], **row}
+        return True
+
+    def _iter_shapefile_features(
+        self,
+        codes: np.ndarray,
+        out_fields: list,
+        max_allowable_offset: float,
+        geometry_precision: int,
+    ):
+        """Reads the geojson features for LSOA codes from the boundaries shapefile, a page of codes at a time."""
+        codes = np.unique(codes)
+        for start in range(0, len(codes), self.fetch_page_size):
+            yield from self._read_geo_json(
+                self._get_boundaries_shapefile().read_codes(
+                    codes[start : start + self.fetch_page_size]
+                ),
+                out_fields,
+                max_allowable_offset,
+                geometry_precision,
+            )["features"]
+
+    def _iter_fetched_features(self, object_ids: np.ndarray, query: dict):
+        """Fetches the geojson features for LSOAs by object id from the boundaries FeatureServer, parsing each
+        response as it arrives."""
+        with self._session(pool_size=1) as session:
+            for chunk in self._object_id_chunks(object_ids):
+                # As in _fetch_geo_json_chunks, keep asking for the next page while the server says there are more
+                offset = 0
+                while True:
+                    page_features = 0
+                    page = self._iter_page_features(
+                        session, self._page_params(query, chunk, offset)
+                    )
+                    while True:
+                        try:
+                            feature = next(page)
+                        except StopIteration as stop:
+                            collection = stop.value
+                            break
+                        page_features += 1
+                        yield feature
+                    offset += page_features
+                    if page_features == 0 or not _exceeded_transfer_limit(collection):
+                        break
+
+    def _iter_page_features(self, session: requests.Session, params: dict):
+        """
+        Fetches a page of boundaries, or reads it from the cache, yielding its features as they are parsed.
+
+        Returns:
+            the other members of the geojson collection
+        """
+        key = ResponseCache.key(self.boundaries_query_url, params)
+        cached = self.cache.get_file(key) if self.cache is not None else None
+        if cached is not None:
+            with cached:
+                return (
+                    yield from iter_feature_collection(
+                        iter(lambda: cached.read(_STREAM_CHUNK_SIZE), "")
+                    )
+                )
+        if self.offline:
+            raise ValueError(
+                f"LSOA boundaries for {params['where']} are not in the cache, and the loader is offline"
+            )
+        with session.get(
+            self.boundaries_query_url,
+            params=params,
+            timeout=self.fetch_timeout,
+            stream=True,
+        ) as response:
+            response.raise_for_status()
+            cache_writer = (
+                self.cache.writer(key)
+                if self.cache is not None
+                else contextlib.nullcontext()
+            )
+            with cache_writer as cache_file:
+
+                def read():
+                    for content in response.iter_content(_STREAM_CHUNK_SIZE):
+                        if cache_file is not None:
+                            cache_file.write(content)
+                        yield content
+
+                contents = read()
+                collection = yield from _iter_response_features(contents)
+                # Read the rest of the response, so all of it is cached
+                for _ in contents:
+                    pass
+                # ArcGIS reports some errors in the body of an OK response, which mustn't be cached
+                _check_query_succeeded(collection)
+            return collection
+
+    def _fetch_geo_json_for_object_ids(
+        self,
+        object_ids: np.ndarray,
+        out_fields: list,
+        max_allowable_offset: float,
+        geometry_precision: int,
+    ) -> dict:
+        """
+        Fetches the geojson for LSOAs by object id from the boundaries FeatureServer.
+        """
+        # Load the LSOA geofiles from the arcgis and merge into one geogson file for processing
+        return self._fetch_geo_json_chunks(
+            self._object_id_chunks(object_ids),
+            self._boundaries_query(
+                out_fields, max_allowable_offset, geometry_precision
+            ),
+        )
+
+    def _object_id_chunks(self, object_ids: np.ndarray) -> list:
+        """Splits object ids into chunks of consecutive ids, of at most a page each.
+
+        Returns:
+            (low, high) object ids of each chunk, inclusive
+        """
+        object_ids = np.unique(object_ids)
+        starts = np.flatnonzero(np.diff(object_ids, prepend=object_ids[0] - 2) > 1)
+        ends = np.append(starts[1:], len(object_ids)) - 1
+        range_lows = object_ids[starts]
+        range_highs = object_ids[ends]
+        pages = (range_highs - range_lows) // self.fetch_page_size + 1
+        chunk_lows = np.repeat(range_lows, pages) + self.fetch_page_size * (
+            np.arange(pages.sum()) - np.repeat(np.cumsum(pages) - pages, pages)
+        )
+        chunk_highs = np.minimum(
+            chunk_lows + self.fetch_page_size - 1, np.repeat(range_highs, pages)
+        )
+        return list(zip(chunk_lows.tolist(), chunk_highs.tolist()))
+
+    def _boundaries_query(
+        self,
+        out_fields: list,
+        max_allowable_offset: float,
+        geometry_precision: int,
+    ) -> dict:
+        """Gets the FeatureServer query parameters other than the object ids and paging."""
+        query = {
+            "outFields": "*",
+            "outSR": "4326",
+            "f": "geojson",
+            "orderByFields": self.lsoa_object_id_col,
+        }
+        if out_fields is not None:
+            fields = [self.lsoa_object_id_col, self.lsoa_code_col] + [
+                field
+                for field in out_fields
+                if field not in (self.lsoa_object_id_col, self.lsoa_code_col)
+            ]
+            query["outFields"] = ",".join(fields)
+        if max_allowable_offset is not None:
+            query["maxAllowableOffset"] = str(max_allowable_offset)
+        if geometry_precision is not None:
+            query["geometryPrecision"] = str(geometry_precision)
+        return query
+
+    def _fetch_geo_json_chunks(self, chunks: list, query: dict) -> dict:
+        """
+        Fetches the geojson for chunks of object ids from the boundaries FeatureServer, several at a time over a
+        pool of kept alive connections. Chunks in the cache are read from there instead.
+
+        Args:
+            chunks: (low, high) object ids of each chunk, inclusive
+            query: The query parameters other than the object ids and paging
+        Returns:
+            geojson feature collection with the features of all chunks, in chunk order
+        """
+        with self._session(pool_size=self.fetch_max_workers) as session:
+
+            def fetch_page(params: dict) -> dict:
+                key = ResponseCache.key(self.boundaries_query_url, params)
+                text = self.cache.get(key) if self.cache is not None else None
+                if text is not None:
+                    return geojson.loads(text)
+                if self.offline:
+                    raise ValueError(
+                        f"LSOA boundaries for {params['where']} are not in the cache, and the loader is offline"
+                    )
+                response = session.get(
+                    self.boundaries_query_url,
+                    params=params,
+                    timeout=self.fetch_timeout,
+                )
+                response.raise_for_status()
+                collection = geojson.loads(response.text)
+                # ArcGIS reports some errors in the body of an OK response, which mustn't be cached
+                _check_query_succeeded(collection)
+                if self.cache is not None:
+                    self.cache.put(key, response.text)
+                return collection
 
-        return remapped_lsoa
+            def fetch(chunk: tuple) -> dict:
+                # A chunk is never more than a page of object ids, but the server can have a lower limit on
+                # records per response, so keep asking for the next page while it says there are more
+                features = []
+                while True:
+                    collection = fetch_page(
+                        self._page_params(query, chunk, len(features))
+                    )
+                    features += collection["features"]
+                    if not collection["features"] or not _exceeded_transfer_limit(
+                        collection
+                    ):
+                        break
+                collection["features"] = features
+                return collection
+
+            with ThreadPoolExecutor(max_workers=self.fetch_max_workers) as executor:
+                # map gives the results in chunk order, whichever finishes first
+                collections = list(executor.map(fetch, chunks))
+
+        lsoa_shapefile = collections[0]
+        lsoa_shapefile["features"] = [
+            feature for collection in collections for feature in collection["features"]
+        ]
+        return lsoa_shapefile
+
+    def _session(self, pool_size: int) -> requests.Session:
+        """Creates a session which keeps up to pool_size connections open, and retries failed requests."""
+        retry = Retry(
+            total=self.fetch_retries,
+            backoff_factor=self.fetch_backoff_factor,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET"],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, max_retries=retry
+        )
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _page_params(self, query: dict, chunk: tuple, offset: int) -> dict:
+        """Gets the query parameters for a page of a chunk of object ids."""
+        return {
+            **query,
+            "where": f"{self.lsoa_object_id_col}>={chunk[0]} AND {self.lsoa_object_id_col}<={chunk[1]}",
+            "resultOffset": str(offset),
+            "resultRecordCount": str(self.fetch_page_size),
+        }
+
+
+_REGEX_SPECIAL_CHARACTERS = set(".^$*+?{}[]\\|()")
+
+
+class _LsoaNameIndex:
+    """
+    An index for finding the LSOAs whose name contains an area name, giving the same LSOAs as str.contains.
+
+    LSOA names are the name of their local authority followed by a code, such as "Cambridge 006A". The LSOAs are
+    grouped by the name before the code, so an area is found by checking the few hundred local authority names
+    rather than every LSOA name. Only areas which could match part of the code, such as "Cambridge 006", or
+    which use regular expressions, need every name checking.
+    """
+
+    def __init__(self, names: pd.Series):
+        self._names = names
+        groups = {}
+        # The characters used in the codes after the last space of any name
+        self._code_characters = set()
+        for position, name in enumerate(names.tolist()):
+            if not isinstance(name, str):
+                continue
+            group, space, code = name.rpartition(" ")
+            if not space:
+                group, code = name, ""
+            self._code_characters.update(code)
+            groups.setdefault(group, []).append(position)
+        self._groups = list(groups)
+        self._group_rows = [np.array(rows, dtype=np.int64) for rows in groups.values()]
+
+    def find(self, area: str) -> np.ndarray:
+        """Gets the positions of the names containing area, in increasing order."""
+        if _REGEX_SPECIAL_CHARACTERS.intersection(area) or self._may_match_code(area):
+            return np.flatnonzero(
+                self._names.str.contains(area).fillna(False).to_numpy(dtype=bool)
+            )
+        rows = [
+            group_rows
+            for group, group_rows in zip(self._groups, self._group_rows)
+            if area in group
+        ]
+        if not rows:
+            return np.array([], dtype=np.int64)
+        return np.sort(np.concatenate(rows))
+
+    def _may_match_code(self, area: str) -> bool:
+        """
+        Whether area could match a name other than within its group name. Such a match would have to end in the
+        code, so either area ends in a space followed by only code characters, or is made up of only code
+        characters.
+        """
+        _, _, last_word = area.rpartition(" ")
+        return all(character in self._code_characters for character in last_word)
+
+
+def _with_python_strings(frame: DataFrame) -> DataFrame:
+    """Copies a data frame read from the typed cache, with its pyarrow backed string columns as ordinary "string"
+    columns, so frames for an area have the same column types as when read straight from the CSV files.
+    """
+    return DataFrame(
+        frame.astype(
+            {
+                column: "string"
+                for column, dtype in frame.dtypes.items()
+                if dtype == pd.StringDtype("pyarrow")
+            }
+        )
+    )
+
+
+def _iter_response_features(contents):
+    """Parses a geojson collection from the bytes of a response, a piece at a time."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    texts = (decoder.decode(content) for content in contents)
+    collection = yield from iter_feature_collection(
+        itertools.chain(texts, iter(lambda: decoder.decode(b"", final=True), ""))
+    )
+    return collection
+
+
+def _check_query_succeeded(collection: dict):
+    """Raises a ValueError with the server's message if an ArcGIS query response is an error rather than features."""
+    if "features" not in collection:
+        raise ValueError(
+            f"LSOA boundaries query failed: {collection.get('error', collection)}"
+        )
+
+
+def _exceeded_transfer_limit(collection: dict) -> bool:
+    """Whether an ArcGIS query response was cut short at the server's limit on records. Depending on the server
+    version, this is flagged at the top level or in the properties of the geojson collection.
+    """
+    return bool(
+        collection.get("exceededTransferLimit")
+        or collection.get("properties", {}).get("exceededTransferLimit")
+    )
 
 
 def read_lsoa_objects_england(
@@ -385,6 +1166,7 @@ def load_lsoa_objects_for_postcode_england(
     names to be loaded. For example, if postcode belongs to Cambridge LSOAs, this function
     will load all Cambridge LSOAs. The usage is to provide postcode of medical facility and
     all surrounding LSOAs for this medical facility will be loaded.
+    The postcode is found using a PostcodeIndex of the mapping file, which is built the first time.
     Parameters
     postcode:
         The postcode in England to map to LSOA name
@@ -399,35 +1181,72 @@ def load_lsoa_objects_for_postcode_england(
     returns:
         Pandas dataframe with loaded LSOAs
     """
-    if global_lsoa is None:
-        global_lsoa = read_lsoa_objects_england()
-
-    postcodes_map_df = pd.read_csv(
-        lsoa_postcode_map_file_path,
-        header=0,
-        usecols=[postcode_col_number, lsoa_code_col_number],
-        names=[postcode_col, lsoa_code_col],
-        dtype="string",
+    postcode_index = _get_postcode_index(
+        lsoa_postcode_map_file_path, postcode_col_number, lsoa_code_col_number
     )
-    postcodes_map_df = postcodes_map_df[
-        postcodes_map_df[postcode_col].str.contains(postcode)
-    ]
-    postcodes_map_df.reset_index(drop=True, inplace=True)
-    if postcodes_map_df.shape[0] == 0:
+    lsoa_code = postcode_index.lookup(postcode)[0]
+    if lsoa_code == "":
+        # Not a whole postcode, so use the first postcode it is the start of
+        lsoa_code = postcode_index.lookup_prefix(postcode)
+    if lsoa_code is None:
         raise ValueError(f"No postcode {postcode} found in the mapping file")
 
-    lsoa_code = postcodes_map_df.at[0, lsoa_code_col]
-    lsoa_name_df = global_lsoa[global_lsoa[lsoa_code_col].str.contains(lsoa_code)]
-    lsoa_name_df.reset_index(drop=True, inplace=True)
+    loader = LsoaLoader()
+    if global_lsoa is None:
+        global_lsoa = loader.read_lsoa_objects_england()
+    lsoa_name_df = global_lsoa[
+        global_lsoa[loader.lsoa_code_col] == lsoa_code
+    ].reset_index(drop=True)
 
     if lsoa_name_df.shape[0] == 0:
         raise ValueError(f"No lsoa with code {lsoa_code} found in global lsoas file")
 
-    lsoa_name = lsoa_name_df.at[0, lsoa_name_col]
-    lsoa_area = "".join(lsoa_name.split()[:-1])
+    lsoa_name = lsoa_name_df.at[0, loader.lsoa_name_col]
+    # The LSOA name is the area name followed by a code, such as "Cambridge 006A"
+    lsoa_area = lsoa_name.rpartition(" ")[0]
     return load_lsoa_objects_for_area_england(lsoa_area, global_lsoa)
 
 
+def lookup_lsoa_codes_for_postcodes(
+    postcodes,
+    lsoa_postcode_map_file_path: str = lsoa_postcode_map_data_path,
+    postcode_col_number: int = 0,
+    lsoa_code_col_number: int = 1,
+) -> np.ndarray:
+    """
+    Looks up the LSOA codes for many postcodes at once, using a PostcodeIndex of the mapping file.
+
+    Args:
+        postcodes: The postcodes to look up. Case and spaces are ignored.
+        lsoa_postcode_map_file_path: The file path with postcode to LSOA mapping
+        postcode_col_number: The column number in the postcode to LSOA mapping file containing postcode
+        lsoa_code_col_number: The column number in the postcode to LSOA mapping file containing LSOA code
+
+    Returns:
+        array of the LSOA code for each postcode, which is "" for postcodes not found
+    """
+    return _get_postcode_index(
+        lsoa_postcode_map_file_path, postcode_col_number, lsoa_code_col_number
+    ).lookup(postcodes)
+
+
+# The postcode indexes opened in this process, keyed by the mapping file and columns
+_postcode_indexes = {}
+
+
+def _get_postcode_index(
+    lsoa_postcode_map_file_path: str,
+    postcode_col_number: int,
+    lsoa_code_col_number: int,
+) -> PostcodeIndex:
+    key = (lsoa_postcode_map_file_path, postcode_col_number, lsoa_code_col_number)
+    if key not in _postcode_indexes:
+        _postcode_indexes[key] = PostcodeIndex(
+            lsoa_postcode_map_file_path, postcode_col_number, lsoa_code_col_number
+        )
+    return _postcode_indexes[key]
+
+
 def load_lsoa_population_estimates_england(
     area: str, global_lsoa_population_estimates: TextFileReader = None
 ) -> DataFrame:
@@ -469,7 +1288,29 @@ def build_lsoa_data_frame_for_area_england(area: str) -> DataFrame:
     return LsoaLoader().build_lsoa_data_frame_for_area_england(area=area)
 
 
-def load_geo_json_shapefiles_for_lsoas(lsoas: DataFrame, area: str = None) -> dict:
+def build_lsoa_data_frame_for_areas(areas: list) -> dict:
+    """
+    Loads and builds data frames containing information about LSOA and population
+    for each of several areas in England, reading the national data only once.
+
+    Args:
+        areas:
+            The names or partial names for the areas to be returned, matched as for
+            build_lsoa_data_frame_for_area_england
+
+    Returns:
+         dictionary of Pandas dataframes with loaded LSOAs and population, keyed by area
+    """
+    return LsoaLoader().build_lsoa_data_frame_for_areas(areas)
+
+
+def load_geo_json_shapefiles_for_lsoas(
+    lsoas: DataFrame,
+    area: str = None,
+    out_fields: list = None,
+    max_allowable_offset: float = None,
+    geometry_precision: int = None,
+) -> dict:
     """
     Loads geojson shape files for provided LSOAs
 
@@ -480,8 +1321,101 @@ def load_geo_json_shapefiles_for_lsoas(lsoas: DataFrame, area: str = None) -> di
             the geoportal. This means that it can load lsoas for areas
             outside of the area of interest. Providing area will ensure
             lsoas will be filtered by the area and only those will be returned.
+        out_fields: The boundary properties to load, or None for all of them
+        max_allowable_offset: If given, how far (in degrees) the server can simplify the boundaries by
+        geometry_precision: If given, the number of decimal places to give boundary coordinates to
 
     Returns:
         dictionary of all lsoas geojson keyed by the lsoa code
     """
-    return LsoaLoader().load_geo_json_shapefiles_for_lsoas(lsoas=lsoas, area=area)
+    return LsoaLoader().load_geo_json_shapefiles_for_lsoas(
+        lsoas=lsoas,
+        area=area,
+        out_fields=out_fields,
+        max_allowable_offset=max_allowable_offset,
+        geometry_precision=geometry_precision,
+    )
+
+
+def build_lsoa_geo_data_frame_for_area_england(
+    area: str,
+    out_fields: list = None,
+    max_allowable_offset: float = None,
+    geometry_precision: int = None,
+) -> gpd.GeoDataFrame:
+    """
+    Builds a GeoDataFrame of the LSOAs in an area in England, with their population and boundaries
+
+    Args:
+        area: The name or partial name for the area, matched as for build_lsoa_data_frame_for_area_england
+        out_fields: The boundary properties to load, or None for all of them
+        max_allowable_offset: If given, how far (in degrees) the server can simplify the boundaries by
+        geometry_precision: If given, the number of decimal places to give boundary coordinates to
+
+    Returns:
+        GeoDataFrame of the LSOAs with their population and boundaries, with its spatial index built
+    """
+    return LsoaLoader().build_lsoa_geo_data_frame_for_area_england(
+        area=area,
+        out_fields=out_fields,
+        max_allowable_offset=max_allowable_offset,
+        geometry_precision=geometry_precision,
+    )
+
+
+def load_geo_json_shapefiles_in_bbox(
+    min_lon: float,
+    min_lat: float,
+    max_lon: float,
+    max_lat: float,
+    out_fields: list = None,
+    shapefile_path: str = lsoa_boundaries_shapefile_path,
+) -> dict:
+    """
+    Loads geojson shape files for the LSOAs in a bounding box, from a local shapefile
+
+    Args:
+        min_lon: Western edge of the box
+        min_lat: Southern edge of the box
+        max_lon: Eastern edge of the box
+        max_lat: Northern edge of the box
+        out_fields: The boundary properties to load, or None for all of them
+        shapefile_path: The shapefile of LSOA boundaries, defaulting to LSOA_2021_EW_BGC.shp in the data directory
+
+    Returns:
+        geojson feature collection of the LSOAs whose bounding boxes overlap the box
+    """
+    return LsoaLoader(
+        boundaries_shapefile_path=shapefile_path
+    ).load_geo_json_shapefiles_in_bbox(
+        min_lon, min_lat, max_lon, max_lat, out_fields=out_fields
+    )
+
+
+def iter_geo_json_features_for_lsoas(
+    lsoas: DataFrame,
+    area: str = None,
+    out_fields: list = None,
+    max_allowable_offset: float = None,
+    geometry_precision: int = None,
+):
+    """
+    Loads the geojson features for provided LSOAs one at a time, for loads too big to hold as one collection
+
+    Args:
+        lsoas: Pandas dataframe containing object ids for all lsoas to load
+        area: Area to filter lsoas by, as for load_geo_json_shapefiles_for_lsoas
+        out_fields: The boundary properties to load, or None for all of them
+        max_allowable_offset: If given, how far (in degrees) the server can simplify the boundaries by
+        geometry_precision: If given, the number of decimal places to give boundary coordinates to
+
+    Yields:
+        each lsoa geojson feature
+    """
+    yield from LsoaLoader().iter_geo_json_features_for_lsoas(
+        lsoas=lsoas,
+        area=area,
+        out_fields=out_fields,
+        max_allowable_offset=max_allowable_offset,
+        geometry_precision=geometry_precision,
+    )
@@ -0,0 +1,136 @@
+import os
+
+import fiona
+import geopandas as gpd
+import numpy as np
+import pyproj
+import shapely
+from shapely.strtree import STRtree
+
+from nhstravel.storage import atomic_write
+
+# Stored in the index file, which is rebuilt when it doesn't match
+_INDEX_VERSION = 2
+
+
+class LsoaShapefile:
+    def __init__(
+        self, shapefile_path: str, code_col: str = "LSOA21CD", index_path: str = None
+    ):
+        """
+        Open a local shapefile of LSOA boundaries, such as LSOA_2021_EW_BGC.shp from the ONS geoportal, for reading
+        just the LSOAs needed.
+
+        Reading uses an index kept in a file alongside the shapefile, with the code and bounding box of each LSOA.
+        The index is built the first time the shapefile is opened, or when the shapefile changes, which reads the
+        whole file once. After that, only the records for the requested LSOAs are read, using the shapefile's own
+        record offsets.
+
+        Args:
+            shapefile_path: Path to the .shp file. The .shx, .dbf and .prj files must be alongside it.
+            code_col: The attribute with the LSOA code
+            index_path: Path to keep the index in. Defaults to the shapefile path with .index.npz in place of .shp
+        """
+        self.shapefile_path = shapefile_path
+        self.code_col = code_col
+        if index_path is not None:
+            self.index_path = index_path
+        else:
+            self.index_path = os.path.splitext(shapefile_path)[0] + ".index.npz"
+        source_stat = _shapefile_stat(shapefile_path)
+        if not self._load_index(source_stat):
+            self._build_index(source_stat)
+        order = np.argsort(self._codes)
+        self._sorted_codes = self._codes[order]
+        self._sorted_rows = order
+        self._tree = STRtree(shapely.box(*self._bounds.T))
+        with fiona.open(shapefile_path) as source:
+            self.crs = source.crs
+
+    def read_codes(self, codes) -> gpd.GeoDataFrame:
+        """
+        Reads the boundaries of the LSOAs with the given codes.
+
+        Args:
+            codes: The LSOA codes to read. Codes not in the shapefile are ignored.
+        Returns:
+            GeoDataFrame of the LSOAs found, in shapefile order, with geometry in latitude and longitude (EPSG:4326)
+        """
+        codes = np.asarray(codes, dtype=str)
+        if len(self._sorted_codes) == 0:
+            return self._read_rows(np.array([], dtype=np.int64))
+        positions = np.minimum(
+            np.searchsorted(self._sorted_codes, codes), len(self._sorted_codes) - 1
+        )
+        found = self._sorted_codes[positions] == codes
+        return self._read_rows(np.unique(self._sorted_rows[positions[found]]))
+
+    def read_bbox(
+        self, min_lon: float, min_lat: float, max_lon: float, max_lat: float
+    ) -> gpd.GeoDataFrame:
+        """
+        Reads the boundaries of the LSOAs whose bounding boxes overlap a bounding box.
+
+        Args:
+            min_lon: Western edge of the box
+            min_lat: Southern edge of the box
+            max_lon: Eastern edge of the box
+            max_lat: Northern edge of the box
+        Returns:
+            GeoDataFrame of the LSOAs found, in shapefile order, with geometry in latitude and longitude (EPSG:4326)
+        """
+        transformer = pyproj.Transformer.from_crs("EPSG:4326", self.crs, always_xy=True)
+        bounds = transformer.transform_bounds(min_lon, min_lat, max_lon, max_lat)
+        return self._read_rows(np.sort(self._tree.query(shapely.box(*bounds))))
+
+    def _read_rows(self, rows: np.ndarray) -> gpd.GeoDataFrame:
+        with fiona.open(self.shapefile_path) as source:
+            features = [source[row] for row in rows.tolist()]
+            columns = list(source.schema["properties"]) + ["geometry"]
+        gdf = gpd.GeoDataFrame.from_features(features, crs=self.crs, columns=columns)
+        return gdf.to_crs("EPSG:4326")
+
+    def _load_index(self, source_stat: np.ndarray) -> bool:
+        if not os.path.exists(self.index_path):
+            return False
+        with np.load(self.index_path, allow_pickle=False) as index:
+            if (
+                index["version"] != _INDEX_VERSION
+                or not np.array_equal(index["source_stat"], source_stat)
+                or index["code_col"] != self.code_col
+            ):
+                return False
+            self._codes = np.char.decode(index["codes"], "utf-8")
+            self._bounds = index["bounds"]
+        return True
+
+    def _build_index(self, source_stat: np.ndarray):
+        codes = []
+        bounds = []
+        with fiona.open(self.shapefile_path) as source:
+            for feature in source:
+                codes.append(feature["properties"][self.code_col])
+                bounds.append(shapely.geometry.shape(feature["geometry"]).bounds)
+        self._codes = np.array(codes, dtype=str)
+        self._bounds = np.array(bounds, dtype=np.float64).reshape(-1, 4)
+        with atomic_write(self.index_path) as f:
+            np.savez(
+                f,
+                version=np.array(_INDEX_VERSION),
+                source_stat=source_stat,
+                code_col=np.array(self.code_col),
+                codes=np.char.encode(self._codes, "utf-8"),
+                bounds=self._bounds,
+            )
+
+
+def _shapefile_stat(shapefile_path: str) -> np.ndarray:
+    """Gets the size and modification time of the geometry and attribute files of a shapefile, so the index can be
+    checked as still up to date without reading the whole shapefile."""
+    stats = [
+        os.stat(path)
+        for path in [shapefile_path, os.path.splitext(shapefile_path)[0] + ".dbf"]
+    ]
+    return np.array(
+        [[stat.st_size, stat.st_mtime_ns] for stat in stats], dtype=np.int64
+    )
@@ -0,0 +1,189 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from nhstravel.storage import atomic_write
+
+# Indexes built with a different version are rebuilt
+_INDEX_VERSION = 1
+_POSTCODES_FILE = "postcodes.npy"
+_LSOA_CODES_FILE = "lsoa_codes.npy"
+_METADATA_FILE = "index.json"
+
+
+class PostcodeIndex:
+    def __init__(
+        self,
+        postcode_map_path: str,
+        postcode_col_number: int = 0,
+        lsoa_code_col_number: int = 1,
+        index_dir: str = None,
+    ):
+        """
+        Open an index of a postcode to LSOA mapping CSV file, for looking up the LSOA of postcodes.
+
+        The index is a directory of two numpy .npy files, with the postcodes sorted and the LSOA code of each. It
+        is built from the CSV the first time, or when the CSV changes. The files are memory mapped rather than
+        read, so a lookup only touches the few pages a binary search needs, and worker processes opening the same
+        index share one copy in the operating system's page cache.
+
+        Postcodes are matched ignoring case and spaces, so "CB2 1TN", "cb21tn" and "CB21TN" are the same.
+
+        Args:
+            postcode_map_path: The CSV file mapping postcodes to LSOA codes
+            postcode_col_number: The column number in the CSV file containing postcode
+            lsoa_code_col_number: The column number in the CSV file containing LSOA code
+            index_dir: The directory to keep the index in. Defaults to the CSV path with .postcodeindex in place
+                of .csv
+        """
+        self.postcode_map_path = postcode_map_path
+        self.postcode_col_number = postcode_col_number
+        self.lsoa_code_col_number = lsoa_code_col_number
+        if index_dir is not None:
+            self.index_dir = index_dir
+        else:
+            self.index_dir = os.path.splitext(postcode_map_path)[0] + ".postcodeindex"
+        self._open()
+
+    def lookup(self, postcodes) -> np.ndarray:
+        """
+        Looks up the LSOA codes of postcodes.
+
+        Args:
+            postcodes: The postcodes to look up
+        Returns:
+            array of the LSOA code of each postcode, which is "" for postcodes not in the mapping or without an LSOA
+        """
+        keys = _normalise(postcodes)
+        if len(self._postcodes) == 0:
+            return np.full(len(keys), "", dtype="U9")
+        # Keys longer than any postcode can't match, and mustn't be cut short to the postcode length
+        width = self._postcodes.dtype.itemsize
+        # numpy unicode strings take 4 bytes a character, so this is the length of the longest key
+        if keys.dtype.itemsize // 4 <= width:
+            fits = True
+        else:
+            fits = np.char.str_len(keys) <= width
+        keys = keys.astype(self._postcodes.dtype)
+        positions = np.minimum(
+            np.searchsorted(self._postcodes, keys), len(self._postcodes) - 1
+        )
+        found = fits & (self._postcodes[positions] == keys)
+        lsoa_codes = np.where(found, self._lsoa_codes[positions], b"")
+        return lsoa_codes.astype(str)
+
+    def lookup_prefix(self, prefix: str) -> str:
+        """
+        Looks up the LSOA code of the first postcode, in sorted order, which starts with prefix.
+
+        Args:
+            prefix: The start of a postcode, such as "CB2 1"
+        Returns:
+            the LSOA code, or None if no postcode with an LSOA starts with prefix
+        """
+        key = _normalise(prefix)[0].encode()
+        start = np.searchsorted(self._postcodes, key)
+        # Step through any postcodes without an LSOA, so this gives the same as a scan for the first match
+        for position in range(start, len(self._postcodes)):
+            if not self._postcodes[position].startswith(key):
+                break
+            if self._lsoa_codes[position]:
+                return self._lsoa_codes[position].decode()
+        return None
+
+    def _open(self):
+        source_stat = os.stat(self.postcode_map_path)
+        metadata = {
+            "version": _INDEX_VERSION,
+            "source_size": source_stat.st_size,
+            "source_mtime_ns": source_stat.st_mtime_ns,
+            "postcode_col_number": self.postcode_col_number,
+            "lsoa_code_col_number": self.lsoa_code_col_number,
+        }
+        metadata_path = os.path.join(self.index_dir, _METADATA_FILE)
+        existing = None
+        if os.path.exists(metadata_path):
+            with open(metadata_path) as f:
+                existing = json.load(f)
+        if existing != metadata:
+            self._build(metadata)
+        self._postcodes = np.load(
+            os.path.join(self.index_dir, _POSTCODES_FILE), mmap_mode="r"
+        )
+        self._lsoa_codes = np.load(
+            os.path.join(self.index_dir, _LSOA_CODES_FILE), mmap_mode="r"
+        )
+
+    def _build(self, metadata: dict):
+        postcode_map = pd.read_csv(
+            self.postcode_map_path,
+            header=0,
+            usecols=[self.postcode_col_number, self.lsoa_code_col_number],
+            dtype="string",
+            encoding="ISO-8859-1",
+        )
+        columns = sorted([self.postcode_col_number, self.lsoa_code_col_number])
+        postcode_col = postcode_map.columns[columns.index(self.postcode_col_number)]
+        lsoa_code_col = postcode_map.columns[columns.index(self.lsoa_code_col_number)]
+        postcode_map.dropna(subset=[postcode_col], inplace=True)
+        postcodes = (
+            postcode_map[postcode_col]
+            .str.replace(" ", "")
+            .str.upper()
+            .to_numpy(dtype=str)
+        )
+        lsoa_codes = postcode_map[lsoa_code_col].fillna("").to_numpy(dtype=str)
+
+        order = np.argsort(postcodes, kind="stable")
+        postcodes = postcodes[order]
+        lsoa_codes = lsoa_codes[order]
+        # Keep the first row of any postcode in the file more than once
+        first = np.ones(len(postcodes), dtype=bool)
+        first[1:] = postcodes[1:] != postcodes[:-1]
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        # The metadata is written last, so an index is only used once all of it is written
+        metadata_path = os.path.join(self.index_dir, _METADATA_FILE)
+        if os.path.exists(metadata_path):
+            os.remove(metadata_path)
+        _save_array(
+            os.path.join(self.index_dir, _POSTCODES_FILE),
+            postcodes[first].astype(np.bytes_),
+        )
+        _save_array(
+            os.path.join(self.index_dir, _LSOA_CODES_FILE),
+            lsoa_codes[first].astype(np.bytes_),
+        )
+        with atomic_write(metadata_path, "w") as f:
+            json.dump(metadata, f, indent=2)
+
+    def __getstate__(self):
+        # The memory mapped arrays are left out when sending the index to another process, which maps the same
+        # files again rather than receiving a copy of them
+        state = self.__dict__.copy()
+        del state["_postcodes"]
+        del state["_lsoa_codes"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+
+def _normalise(postcodes) -> np.ndarray:
+    """Upper cases one or more postcodes and removes their spaces."""
+    if isinstance(postcodes, str):
+        postcodes = [postcodes]
+    elif isinstance(postcodes, (np.ndarray, pd.Series)):
+        postcodes = postcodes.tolist()
+    # Plain string methods are much faster than numpy's per element string functions
+    return np.array(
+        [postcode.replace(" ", "").upper() for postcode in postcodes], dtype=str
+    )
+
+
+def _save_array(path: str, array: np.ndarray):
+    with atomic_write(path) as f:
+        np.save(f, array)
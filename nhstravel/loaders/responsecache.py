@@ -0,0 +1,128 @@
+import contextlib
+import hashlib
+import json
+import os
+import threading
+
+from nhstravel.storage import atomic_write
+
+
+class ResponseCache:
+    def __init__(self, cache_dir: str, max_bytes: int = 1 << 30):
+        """
+        Create a cache of web service responses, kept as one file per response in a directory.
+
+        Each response is stored under a hash of its request, so the same query always finds the same file. When the
+        files take up more than max_bytes, the least recently used are deleted.
+
+        Args:
+            cache_dir: The directory to keep the responses in. It is created if it doesn't exist.
+            max_bytes: The most space the responses can take up before the least recently used are deleted
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(url: str, params: dict = None) -> str:
+        """
+        Gets the cache key for a request.
+
+        Args:
+            url: The URL of the request, without the query string
+            params: The query parameters of the request
+        Returns:
+            a hex sha256 digest of the URL and parameters, which doesn't depend on the parameter order
+        """
+        request = json.dumps([url, sorted((params or {}).items())])
+        return hashlib.sha256(request.encode()).hexdigest()
+
+    def get(self, key: str) -> str:
+        """
+        Gets a cached response, marking it as recently used.
+
+        Args:
+            key: The cache key, from ResponseCache.key
+        Returns:
+            the response text, or None if it isn't in the cache
+        """
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return text
+
+    def put(self, key: str, text: str):
+        """
+        Adds a response to the cache, then deletes the least recently used responses if the cache is too big.
+
+        Args:
+            key: The cache key, from ResponseCache.key
+            text: The response text
+        """
+        # Other threads and processes never read a partly written response
+        with atomic_write(self._path(key), "w", encoding="utf-8") as f:
+            f.write(text)
+        self._evict()
+
+    def get_file(self, key: str):
+        """
+        Opens a cached response for reading a piece at a time, marking it as recently used.
+
+        Args:
+            key: The cache key, from ResponseCache.key
+        Returns:
+            the response as an open text file, or None if it isn't in the cache
+        """
+        path = self._path(key)
+        try:
+            f = open(path, encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted since it was opened, but it can still be read
+            pass
+        return f
+
+    @contextlib.contextmanager
+    def writer(self, key: str):
+        """
+        Adds a response to the cache a piece at a time, as it is received. The response is only added if the with
+        block finishes without an exception, and then the least recently used responses are deleted if the cache is
+        too big.
+
+        Args:
+            key: The cache key, from ResponseCache.key
+        Yields:
+            a binary file to write the UTF-8 response text to
+        """
+        with atomic_write(self._path(key)) as f:
+            yield f
+        self._evict()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def _evict(self):
+        with self._lock:
+            entries = [
+                entry
+                for entry in os.scandir(self.cache_dir)
+                if entry.name.endswith(".json")
+            ]
+            stats = [(entry.path, entry.stat()) for entry in entries]
+            total = sum(stat.st_size for _, stat in stats)
+            for path, stat in sorted(stats, key=lambda item: item[1].st_mtime_ns):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= stat.st_size
@@ -0,0 +1,92 @@
+import json
+import os
+from typing import Callable
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather
+from pandas import DataFrame
+
+from nhstravel.storage import atomic_write
+
+# Part of the cache metadata, so cache files in an older layout don't match and are rewritten
+_CACHE_VERSION = 1
+_METADATA_KEY = b"nhstravel.typedcache"
+
+
+def read_typed_cache(
+    csv_path: str,
+    read_csv: Callable[[], DataFrame],
+    settings: dict = None,
+    columns: list = None,
+    cache_dir: str = None,
+) -> DataFrame:
+    """
+    Reads a data frame parsed from a CSV file, from a typed columnar copy of it.
+
+    The first time, or when the CSV file or settings change, read_csv is called to parse and type the CSV, and the
+    result is written to an uncompressed Arrow (Feather) file. After that, the file is memory mapped and only the
+    columns asked for are read, which is much faster than parsing the CSV again. Text columns are kept in Arrow
+    memory rather than as a Python string per value.
+
+    Args:
+        csv_path: The CSV file the data frame is parsed from
+        read_csv: Parses the CSV file, returning the data frame with its columns already typed
+        settings: Anything else that changes what read_csv returns, such as which columns it reads. The cache is
+            only used if it was written with the same settings. Must be JSON serialisable.
+        columns: The columns to read, or None for all of them
+        cache_dir: The directory to keep the Arrow file in, defaulting to the directory of the CSV file. If the
+            Arrow file can't be read or written, such as when another user wrote it, the CSV is parsed instead.
+    Returns:
+        the data frame, with text columns as pyarrow backed "string" columns
+    """
+    if cache_dir is None:
+        cache_dir = os.path.dirname(os.path.abspath(csv_path))
+    cache_path = os.path.join(
+        cache_dir, os.path.splitext(os.path.basename(csv_path))[0] + ".arrow"
+    )
+    # The size and modification time identify the CSV file contents well enough, and unlike a hash don't need
+    # the whole file to be read
+    stat = os.stat(csv_path)
+    metadata = json.dumps(
+        {
+            "version": _CACHE_VERSION,
+            "source_size": stat.st_size,
+            "source_mtime_ns": stat.st_mtime_ns,
+            "settings": settings or {},
+        },
+        sort_keys=True,
+    ).encode()
+
+    if os.path.exists(cache_path):
+        try:
+            table = pyarrow.feather.read_table(cache_path, memory_map=True)
+        except (OSError, pa.ArrowInvalid):
+            # Such as a cache file written by another user which can't be read, or which isn't an Arrow file
+            table = None
+        if (
+            table is not None
+            and (table.schema.metadata or {}).get(_METADATA_KEY) == metadata
+        ):
+            return _to_pandas(table.select(columns) if columns is not None else table)
+
+    frame = read_csv()
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    table = table.replace_schema_metadata(
+        {**(table.schema.metadata or {}), _METADATA_KEY: metadata}
+    )
+    try:
+        with atomic_write(cache_path) as f:
+            pyarrow.feather.write_feather(table, f, compression="uncompressed")
+    except OSError:
+        pass
+    return _to_pandas(table.select(columns) if columns is not None else table)
+
+
+def _to_pandas(table: pa.Table) -> DataFrame:
+    return table.to_pandas(
+        types_mapper={
+            pa.string(): pd.StringDtype("pyarrow"),
+            pa.large_string(): pd.StringDtype("pyarrow"),
+        }.get
+    )
@@ -0,0 +1,148 @@
+"""A local store of a walking road network, so graphs for areas can be served without downloading them from OSM.
+
+The network is read once from a local OpenStreetMap extract and kept as numpy arrays of nodes and edges, which are
+saved to a .npz file for fast loading next time. Subgraphs for a polygon are then cut out using a spatial index over
+the nodes.
+
+Typical usage is:
+
+  network = RoadNetwork.from_extract("data/england-walk.graphml", store_path="data/england-walk.npz")
+  region.calculate_walking_distance_polys(triangle, network=network)
+"""
+
+from __future__ import annotations
+import os
+
+import networkx
+import numpy as np
+import osmnx
+import shapely
+from shapely.geometry import Polygon
+from shapely.strtree import STRtree
+
+from nhstravel.routing import CsrGraph
+from nhstravel.storage import atomic_write, file_digest
+
+_STORE_VERSION = 2
+
+
+class RoadNetwork:
+    """A directed road network held as a CsrGraph, with a spatial index over its nodes for cutting out areas."""
+
+    graph: CsrGraph
+    # spatial index over the nodes, built when first needed
+    _node_tree: STRtree | None
+
+    def __init__(self, graph: CsrGraph):
+        self.graph = graph
+        self._node_tree = None
+
+    @staticmethod
+    def from_graph(graph: networkx.MultiDiGraph) -> RoadNetwork:
+        """Builds the network from an osmnx graph, with "x" and "y" on each node and "length" on each edge."""
+        return RoadNetwork(CsrGraph.from_graph(graph))
+
+    @staticmethod
+    def from_extract(path: str, store_path: str = None) -> RoadNetwork:
+        """Loads the network from a local OpenStreetMap extract.
+
+        The extract should already be cut down to the ways wanted for walking, as every way in it is used. It can be
+        a .graphml file saved by osmnx.save_graphml, or a .osm XML file. PBF extracts, as published by Geofabrik,
+        need converting to XML first, for example with osmium cat england.osm.pbf -o england.osm
+
+        :param path: the extract file
+        :param store_path: optional - a .npz file to keep the network arrays in. If the file was saved from the same
+               extract content, the network is loaded from it instead of reading the extract. Otherwise the network
+               is built and the file is (re)written.
+        :return: the network
+        """
+        source_hash = None
+        if store_path is not None:
+            source_hash = file_digest(path).hexdigest()
+            network = RoadNetwork.load(store_path, source_hash)
+            if network is not None:
+                return network
+        if path.endswith(".graphml"):
+            graph = osmnx.load_graphml(path)
+        else:
+            graph = osmnx.graph_from_xml(path, bidirectional=True, retain_all=True)
+        network = RoadNetwork.from_graph(graph)
+        if store_path is not None:
+            network.save(store_path, source_hash)
+        return network
+
+    @staticmethod
+    def load(path: str, source_hash: str = None) -> RoadNetwork | None:
+        """Loads a network saved with save.
+
+        :param path: the store file
+        :param source_hash: optional - if given, the store is only used if it was saved with the same hash
+        :return: the network, or None if there is no store file or it was saved with a different hash
+        """
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as store:
+            if store["version"] != _STORE_VERSION or (
+                source_hash is not None and store["source_hash"] != source_hash
+            ):
+                return None
+            return RoadNetwork(
+                CsrGraph(
+                    store["node_ids"],
+                    store["xs"],
+                    store["ys"],
+                    store["indptr"],
+                    store["indices"],
+                    store["lengths"],
+                    store["times"] if "times" in store else None,
+                )
+            )
+
+    def save(self, path: str, source_hash: str = ""):
+        """Saves the network arrays to a binary numpy .npz file.
+
+        The file is written to a temporary file and then moved into place, so processes loading it at the same time
+        never see a partly written store.
+
+        :param path: the store file
+        :param source_hash: a hash of the extract the network was built from
+        """
+        arrays = {
+            "version": np.array(_STORE_VERSION),
+            "source_hash": np.array(source_hash),
+            "node_ids": self.graph.node_ids,
+            "xs": self.graph.xs,
+            "ys": self.graph.ys,
+            "indptr": self.graph.indptr,
+            "indices": self.graph.indices,
+            "lengths": self.graph.lengths,
+        }
+        if self.graph.times is not None:
+            arrays["times"] = self.graph.times
+        with atomic_write(path) as f:
+            np.savez(f, **arrays)
+
+    def subgraph(self, polygon: Polygon) -> networkx.MultiDiGraph:
+        """Gets the graph of the nodes inside the polygon and the edges between them, as an osmnx style graph.
+
+        This is the same graph as osmnx.truncate.truncate_graph_polygon with retain_all=True gives for the whole
+        network, but only looks at the nodes near the polygon.
+        """
+        return self.csr_subgraph(polygon).to_networkx()
+
+    def csr_subgraph(self, polygon: Polygon) -> CsrGraph:
+        """Gets the graph of the nodes inside the polygon and the edges between them."""
+        inside = np.sort(self._get_node_tree().query(polygon, predicate="intersects"))
+        return self.graph.induced(inside)
+
+    def _get_node_tree(self) -> STRtree:
+        """Gets a spatial index over the nodes, building it on first use."""
+        if self._node_tree is None:
+            self._node_tree = STRtree(shapely.points(self.graph.xs, self.graph.ys))
+        return self._node_tree
+
+    def __getstate__(self):
+        # The spatial index is left out when sending the network to another process, as it is quick to rebuild
+        state = self.__dict__.copy()
+        state["_node_tree"] = None
+        return state
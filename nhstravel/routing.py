@@ -0,0 +1,349 @@
+"""A compact road graph in compressed sparse row (CSR) form, with shortest paths run by scipy.sparse.csgraph.
+
+Building one from an osmnx graph walks the networkx graph once. After that the nodes and edges are plain numpy
+arrays, so shortest path searches run in compiled code rather than over networkx's dicts of edge attributes.
+
+Typical usage is:
+
+  graph = CsrGraph.from_graph(osmnx.graph_from_polygon(poly, network_type="walk"))
+  sources = graph.nearest([(-0.085, 51.52), (-0.095, 51.50)])
+  metres = graph.shortest_path_lengths(sources)
+"""
+
+from __future__ import annotations
+
+import networkx
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+import shapely
+from shapely.geometry import Polygon
+
+WEIGHTS = ["length", "time"]
+
+
+class CsrGraph:
+    """A directed graph with nodes in (Longitude, Latitude), and edge weights of length in metres and, optionally,
+    travel time in seconds.
+
+    Nodes are referred to by their position, from 0 to len(node_ids) - 1, with node_ids giving the original (OSM) id
+    of each. Parallel edges between the same two nodes are merged, keeping the shortest length, as only the
+    shortest is ever used.
+    """
+
+    node_ids: np.ndarray
+    xs: np.ndarray
+    ys: np.ndarray
+    # the edges from the node at position n go to positions indices[indptr[n]:indptr[n + 1]], with weights at the
+    # same positions in lengths and times
+    indptr: np.ndarray
+    indices: np.ndarray
+    lengths: np.ndarray
+    times: np.ndarray | None
+    # sorted node_ids and their positions, for looking up positions by id, built when first needed
+    _sorted_ids: np.ndarray | None
+    _sorted_positions: np.ndarray | None
+
+    def __init__(
+        self,
+        node_ids: np.ndarray,
+        xs: np.ndarray,
+        ys: np.ndarray,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        lengths: np.ndarray,
+        times: np.ndarray = None,
+    ):
+        self.node_ids = node_ids
+        self.xs = xs
+        self.ys = ys
+        self.indptr = indptr
+        self.indices = indices
+        self.lengths = lengths
+        self.times = times
+        self._sorted_ids = None
+        self._sorted_positions = None
+
+    @staticmethod
+    def from_graph(
+        graph: networkx.MultiDiGraph, time_weight: str = "travel_time"
+    ) -> CsrGraph:
+        """Builds the graph from an osmnx graph, with "x" and "y" on each node and "length" on each edge.
+
+        :param graph: the graph, with integer node ids
+        :param time_weight: the edge attribute with the travel time in seconds, as added by
+               osmnx.add_edge_travel_times. Times are only kept if every edge has one.
+        """
+        positions = {node: i for i, node in enumerate(graph.nodes)}
+        node_data = graph.nodes(data=True)
+        count = len(node_data)
+        xs = np.fromiter((node["x"] for _, node in node_data), np.float64, count)
+        ys = np.fromiter((node["y"] for _, node in node_data), np.float64, count)
+        n_edges = graph.number_of_edges()
+        sources = np.empty(n_edges, dtype=np.int64)
+        targets = np.empty(n_edges, dtype=np.int64)
+        lengths = np.empty(n_edges, dtype=np.float64)
+        times = np.full(n_edges, np.nan)
+        for i, (u, v, edge) in enumerate(graph.edges(data=True)):
+            sources[i] = positions[u]
+            targets[i] = positions[v]
+            lengths[i] = edge.get("length", 1)
+            times[i] = edge.get(time_weight, np.nan)
+        return CsrGraph.from_edges(
+            np.array(list(graph.nodes), dtype=np.int64),
+            xs,
+            ys,
+            sources,
+            targets,
+            lengths,
+            None if np.isnan(times).any() else times,
+        )
+
+    @staticmethod
+    def from_edges(
+        node_ids: np.ndarray,
+        xs: np.ndarray,
+        ys: np.ndarray,
+        sources: np.ndarray,
+        targets: np.ndarray,
+        lengths: np.ndarray,
+        times: np.ndarray = None,
+    ) -> CsrGraph:
+        """Builds the graph from arrays of nodes, and of edges given by the positions of the nodes at each end."""
+        # Sort by source, then target, then length, so the first of each run of parallel edges is the shortest
+        order = np.lexsort((lengths, targets, sources))
+        sources, targets = sources[order], targets[order]
+        first = np.ones(len(sources), dtype=bool)
+        first[1:] = (sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1])
+        keep = order[first]
+        return CsrGraph(
+            node_ids,
+            xs,
+            ys,
+            np.searchsorted(sources[first], np.arange(len(node_ids) + 1)),
+            targets[first].astype(np.int32),
+            lengths[keep].astype(np.float32),
+            times[keep].astype(np.float32) if times is not None else None,
+        )
+
+    def positions(self, ids) -> np.ndarray:
+        """Gets the positions of nodes from their ids."""
+        if self._sorted_ids is None:
+            self._sorted_positions = np.argsort(self.node_ids)
+            self._sorted_ids = self.node_ids[self._sorted_positions]
+        ids = np.asarray(ids, dtype=np.int64)
+        found = np.minimum(
+            np.searchsorted(self._sorted_ids, ids), len(self._sorted_ids) - 1
+        )
+        if len(ids) > 0 and (self._sorted_ids[found] != ids).any():
+            raise KeyError(
+                f"Nodes not in the graph: {ids[self._sorted_ids[found] != ids]}"
+            )
+        return self._sorted_positions[found]
+
+    def inside(self, polygon: Polygon) -> np.ndarray:
+        """Gets a boolean mask of the nodes inside the polygon."""
+        shapely.prepare(polygon)
+        return shapely.contains_xy(polygon, self.xs, self.ys)
+
+    def nearest(self, points) -> np.ndarray:
+        """Gets the positions of the nodes nearest each of a list of (Longitude, Latitude) points, by great circle
+        distance."""
+        points = np.radians(np.asarray(points, dtype=np.float64).reshape(-1, 2))
+        node_xs = np.radians(self.xs)[np.newaxis, :]
+        node_ys = np.radians(self.ys)[np.newaxis, :]
+        point_xs = points[:, 0:1]
+        point_ys = points[:, 1:2]
+        # the haversine of the angle between each point and each node, which increases with distance
+        haversines = (
+            np.sin((node_ys - point_ys) / 2) ** 2
+            + np.cos(point_ys) * np.cos(node_ys) * np.sin((node_xs - point_xs) / 2) ** 2
+        )
+        return np.argmin(haversines, axis=1)
+
+    def induced(self, positions: np.ndarray) -> CsrGraph:
+        """Gets the graph of just the nodes at the given positions, in that order, and the edges between them."""
+        positions = np.asarray(positions, dtype=np.int64)
+        new_positions = np.full(len(self.node_ids), -1, dtype=np.int64)
+        new_positions[positions] = np.arange(len(positions))
+
+        starts = self.indptr[positions]
+        counts = self.indptr[positions + 1] - starts
+        # the position of each edge within the run of edges of its source
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        edges = np.repeat(starts, counts) + within
+        sources = np.repeat(np.arange(len(positions)), counts)
+        targets = new_positions[self.indices[edges]]
+        keep = targets >= 0
+        edges, sources, targets = edges[keep], sources[keep], targets[keep]
+        # keep the edges of each node sorted by target, as positions may not be in order
+        order = np.lexsort((targets, sources))
+        return CsrGraph(
+            self.node_ids[positions],
+            self.xs[positions],
+            self.ys[positions],
+            np.searchsorted(sources[order], np.arange(len(positions) + 1)),
+            targets[order].astype(np.int32),
+            self.lengths[edges[order]],
+            self.times[edges[order]] if self.times is not None else None,
+        )
+
+    def subgraph(self, polygon: Polygon) -> CsrGraph:
+        """Gets the graph of the nodes inside the polygon and the edges between them."""
+        return self.induced(np.flatnonzero(self.inside(polygon)))
+
+    def shortest_path_lengths(
+        self,
+        sources,
+        weight: str = "length",
+        cutoff: float = None,
+        reverse: bool = False,
+        targets=None,
+    ) -> np.ndarray:
+        """Gets the shortest path length from the nearest of one or more source nodes to every node.
+
+        :param sources: the positions of the source nodes
+        :param weight: "length" for metres or "time" for seconds
+        :param cutoff: optional - stop searching at this length, leaving all nodes further away unreached
+        :param reverse: measure the lengths of paths from every node *to* the nearest source instead
+        :param targets: optional - the positions of the nodes whose lengths are wanted. The search stops once they
+               have all been reached, or can't be, so nodes further away than all of them may be left unreached.
+        :return: an array with the length for each node position, which is infinite for nodes not reached
+        """
+        matrix = self._matrix(weight, reverse)
+        sources = np.atleast_1d(sources)
+        if targets is None:
+            return scipy.sparse.csgraph.dijkstra(
+                matrix,
+                indices=sources,
+                min_only=True,
+                limit=np.inf if cutoff is None else cutoff,
+            )
+        # scipy's search can't stop at a set of nodes, only at a length, so search up to a length which
+        # probably reaches all the targets, and double it until it does
+        targets = np.atleast_1d(targets)
+        limit = self._length_estimate(sources, targets, weight, matrix)
+        while True:
+            if cutoff is not None and limit >= cutoff:
+                limit = cutoff
+            lengths = scipy.sparse.csgraph.dijkstra(
+                matrix, indices=sources, min_only=True, limit=limit
+            )
+            reached = np.isfinite(lengths)
+            if limit == cutoff or reached[targets].all():
+                return lengths
+            # Stop if the search reached everything it could, so the rest of the targets are unreachable
+            edge_sources = np.repeat(np.arange(len(reached)), np.diff(matrix.indptr))
+            if not (reached[edge_sources] & ~reached[matrix.indices]).any():
+                return lengths
+            limit *= 2
+
+    def shortest_path_length_matrix(
+        self, sources, targets, weight: str = "length", cutoff: float = None
+    ) -> np.ndarray:
+        """Gets the shortest path lengths from each of several source nodes to each of several target nodes.
+
+        :param sources: the positions of the source nodes
+        :param targets: the positions of the target nodes
+        :param weight: "length" for metres or "time" for seconds
+        :param cutoff: optional - stop searching at this length, leaving all pairs further apart infinite
+        :return: a (len(sources), len(targets)) array of lengths, which are infinite where there is no path
+        """
+        lengths = scipy.sparse.csgraph.dijkstra(
+            self._matrix(weight, False),
+            indices=np.atleast_1d(sources),
+            limit=np.inf if cutoff is None else cutoff,
+        )
+        return lengths[:, np.atleast_1d(targets)]
+
+    def shortest_path(self, source: int, target: int, weight: str = "length") -> list:
+        """Gets the positions of the nodes along a shortest path from source to target, including both.
+
+        :raises networkx.NetworkXNoPath: if target can't be reached from source, as networkx.shortest_path does
+        """
+        _, predecessors = scipy.sparse.csgraph.dijkstra(
+            self._matrix(weight, False), indices=source, return_predecessors=True
+        )
+        if source != target and predecessors[target] < 0:
+            raise networkx.NetworkXNoPath(f"No path from {source} to {target}")
+        path = [target]
+        while path[-1] != source:
+            path.append(int(predecessors[path[-1]]))
+        return path[::-1]
+
+    def to_networkx(self) -> networkx.MultiDiGraph:
+        """Gets the graph as an osmnx style MultiDiGraph, with "x" and "y" on each node and "length", and
+        "travel_time" if there are times, on each edge."""
+        graph = networkx.MultiDiGraph(crs="epsg:4326")
+        graph.add_nodes_from(
+            (node, {"x": x, "y": y})
+            for node, x, y in zip(
+                self.node_ids.tolist(), self.xs.tolist(), self.ys.tolist()
+            )
+        )
+        sources = np.repeat(np.arange(len(self.node_ids)), np.diff(self.indptr))
+        edge_data = [{"length": length} for length in self.lengths.tolist()]
+        if self.times is not None:
+            for data, time in zip(edge_data, self.times.tolist()):
+                data["travel_time"] = time
+        graph.add_edges_from(
+            zip(
+                self.node_ids[sources].tolist(),
+                self.node_ids[self.indices].tolist(),
+                edge_data,
+            )
+        )
+        return graph
+
+    def _length_estimate(
+        self,
+        sources: np.ndarray,
+        targets: np.ndarray,
+        weight: str,
+        matrix: scipy.sparse.csr_matrix,
+    ) -> float:
+        """Estimates the length of a search from sources which reaches all of targets, from the great circle
+        distance to the furthest of them, or for times, how long that takes at the fastest edge speed.
+        """
+        distances = _great_circle_m(
+            self.xs[sources][np.newaxis, :],
+            self.ys[sources][np.newaxis, :],
+            self.xs[targets][:, np.newaxis],
+            self.ys[targets][:, np.newaxis],
+        )
+        estimate = distances.min(axis=1).max(initial=0.0)
+        if weight == "time":
+            moving = self.times > 0
+            if moving.any():
+                estimate /= (self.lengths[moving] / self.times[moving]).max()
+        # Search at least a few typical edges, in case the targets are at the sources
+        if matrix.nnz > 0:
+            estimate = max(estimate, 4 * float(np.median(matrix.data)))
+        return max(estimate, 1.0)
+
+    def _matrix(self, weight: str, reverse: bool) -> scipy.sparse.csr_matrix:
+        if weight not in WEIGHTS:
+            raise ValueError(f"weight must be one of {WEIGHTS}, not {weight}")
+        if weight == "time" and self.times is None:
+            raise ValueError("The graph has no travel times")
+        data = self.lengths if weight == "length" else self.times
+        n_nodes = len(self.node_ids)
+        # Built directly from the arrays, so that explicit zeros are kept as zero weight edges
+        matrix = scipy.sparse.csr_matrix(
+            (data, self.indices, self.indptr), shape=(n_nodes, n_nodes)
+        )
+        return matrix.T.tocsr() if reverse else matrix
+
+
+# The mean radius of the earth, as used by haversine
+_EARTH_RADIUS_M = 6371008.8
+
+
+def _great_circle_m(x1, y1, x2, y2) -> np.ndarray:
+    """Gets the great circle distances in metres between (Longitude, Latitude) points, broadcasting as numpy does."""
+    x1, y1, x2, y2 = np.radians(x1), np.radians(y1), np.radians(x2), np.radians(y2)
+    haversines = (
+        np.sin((y2 - y1) / 2) ** 2
+        + np.cos(y1) * np.cos(y2) * np.sin((x2 - x1) / 2) ** 2
+    )
+    return 2 * _EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(haversines, 1.0)))
@@ -0,0 +1,77 @@
+"""Helpers for the files nhstravel keeps alongside its data, such as snapshots, indexes and caches.
+
+These files are shared between processes, which may read one while another is writing it, so they are always
+written with atomic_write. Files built from a source file record file_digest of the source, so they can be checked
+as still up to date.
+
+Typical usage is:
+
+  with atomic_write("data/england.npz") as f:
+      np.savez(f, **arrays)
+"""
+
+from __future__ import annotations
+import contextlib
+import hashlib
+import os
+import tempfile
+
+# The process umask, read when first needed
+_umask: int | None = None
+
+
+@contextlib.contextmanager
+def atomic_write(path: str, mode: str = "wb", encoding: str = None):
+    """Opens a file for writing which only replaces path once the with block finishes without an exception.
+
+    The content is written to a temporary file in the same directory, which is then moved into place, so other
+    processes reading path see either the old file or the new one, never a partly written one. If the block raises,
+    the temporary file is removed and path is left as it was.
+
+    The file is given the permissions a newly created file gets from the umask, so other users can read it as they
+    could a file written with open, rather than the owner only permissions of a temporary file.
+
+    :param path: the file to write
+    :param mode: the mode to open the temporary file with, "wb" for binary or "w" for text
+    :param encoding: the text encoding, for text mode
+    :return: the open temporary file, as the target of the with statement
+    """
+    f = tempfile.NamedTemporaryFile(
+        mode,
+        encoding=encoding,
+        dir=os.path.dirname(os.path.abspath(path)),
+        suffix=".tmp",
+        delete=False,
+    )
+    try:
+        with f:
+            yield f
+    except BaseException:
+        os.remove(f.name)
+        raise
+    os.chmod(f.name, 0o666 & ~_get_umask())
+    os.replace(f.name, path)
+
+
+def file_digest(*paths: str):
+    """Hashes the content of one or more files, in order.
+
+    :param paths: the files to hash
+    :return: a hashlib sha256 object, which more can be added to with update before taking its hexdigest
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest
+
+
+def _get_umask() -> int:
+    global _umask
+    if _umask is None:
+        # The umask can only be read by setting it, so set it straight back. This is only done once, as another
+        # thread creating a file in between would get the wrong permissions.
+        _umask = os.umask(0o022)
+        os.umask(_umask)
+    return _umask
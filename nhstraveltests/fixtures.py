@@ -0,0 +1,38 @@
+"""Small made up data sets shared between tests, so they don't need network access or the full data files."""
+
+import networkx
+import numpy as np
+import pandas as pd
+from haversine import haversine, Unit
+
+
+def grid_graph(min_x, min_y, max_x, max_y, step):
+    """A walkable grid of streets, with edges both ways between neighbouring nodes."""
+    graph = networkx.MultiDiGraph(crs="epsg:4326")
+    xs = np.arange(min_x, max_x, step)
+    ys = np.arange(min_y, max_y, step)
+    for i, x in enumerate(xs):
+        for j, y in enumerate(ys):
+            graph.add_node((i, j), x=x, y=y)
+    for i, j in list(graph.nodes):
+        for v in [(i + 1, j), (i, j + 1)]:
+            if v in graph:
+                length = haversine(
+                    (ys[j], xs[i]), (ys[v[1]], xs[v[0]]), unit=Unit.METERS
+                )
+                graph.add_edge((i, j), v, length=length)
+                graph.add_edge(v, (i, j), length=length)
+    return networkx.convert_node_labels_to_integers(graph)
+
+
+def triangle_with_middle_df():
+    return pd.DataFrame(
+        {
+            "Name": ["TOP", "LEFT", "RIGHT", "MIDDLE"],
+            "latitude": [51.52, 51.50, 51.50, 51.51],
+            "longitude": [-0.085, -0.095, -0.080, -0.085],
+            "Postcode": ["", "", "", ""],
+            "National Grouping": ["", "", "", ""],
+            "High Level Health Geography": ["", "", "", ""],
+        }
+    )
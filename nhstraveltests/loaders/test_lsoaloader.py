@@ -1,15 +1,188 @@
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
 import unittest
+import urllib.parse
+import warnings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import geopandas as gpd
 import pandas as pd
+import pyproj
+import requests
 from pandas.testing import assert_frame_equal
+from shapely.geometry import Point, box
+from nhstravel.loaders.geojsonstream import iter_feature_collection
 from nhstravel.loaders.lsoaloader import (
-    read_lsoa_objects_england,
+    LsoaLoader,
     load_lsoa_objects_for_area_england,
+    load_lsoa_objects_for_postcode_england,
+    lookup_lsoa_codes_for_postcodes,
 )
+from nhstravel.loaders.lsoashapefile import LsoaShapefile
+from nhstravel.loaders.postcodeindex import PostcodeIndex
+from nhstravel.loaders.responsecache import ResponseCache
+
+
+def _lsoa_feature(object_id: int) -> dict:
+    return {
+        "type": "Feature",
+        "id": object_id,
+        "geometry": {"type": "Point", "coordinates": [0.1, 52.2]},
+        "properties": {
+            "OBJECTID": object_id,
+            "LSOA21CD": f"E{object_id:08d}",
+            "Shape__Area": 1000.0 * object_id,
+        },
+    }
+
+
+def _write_shapefile(directory: str) -> str:
+    """Writes a shapefile of a 4 by 3 grid of 1km square LSOAs near Cambridge, in British National Grid, with codes
+    numbered from the south west, row by row."""
+    squares = [
+        box(
+            545000 + 1000 * column,
+            258000 + 1000 * row,
+            546000 + 1000 * column,
+            259000 + 1000 * row,
+        )
+        for row in range(3)
+        for column in range(4)
+    ]
+    path = os.path.join(directory, "lsoas.shp")
+    gpd.GeoDataFrame(
+        {
+            "LSOA21CD": [f"E{n:08d}" for n in range(1, 13)],
+            "LSOA21NM": [f"Cambridge {n:03d}A" for n in range(1, 13)],
+        },
+        geometry=squares,
+        crs="EPSG:27700",
+    ).to_file(path)
+    return path
+
+
+def _write_lsoa_csvs(directory: str) -> dict:
+    """Writes definitions and population CSVs for the LSOAs of _write_shapefile, with object ids numbered as the
+    codes and the last LSOA left out of the definitions, and returns the loader arguments to read them.
+    """
+    definitions_path = os.path.join(directory, "definitions.csv")
+    pd.DataFrame(
+        {
+            "OBJECTID": range(1, 12),
+            "LSOA21CD": [f"E{n:08d}" for n in range(1, 12)],
+            "LSOA21NM": [f"Cambridge {n:03d}A" for n in range(1, 12)],
+            "GlobalID": [f"{n}" for n in range(1, 12)],
+        }
+    ).to_csv(definitions_path, index=False)
+    population_path = os.path.join(directory, "population.csv")
+    with open(population_path, "w") as f:
+        f.write("\n" * 9)
+        f.write("name,code,population\n")
+        for n in range(1, 13):
+            f.write(f'Cambridge {n:03d}A,E{n:08d},"1,{n:03d}"\n')
+    return {
+        "definitions_data_path": definitions_path,
+        "population_data_path": population_path,
+        "typed_cache_dir": directory,
+    }
+
+
+class _FeatureServer(ThreadingHTTPServer):
+    """A local stand in for the ArcGIS FeatureServer query endpoint, serving canned LSOA features by OBJECTID."""
+
+    daemon_threads = True
+
+    def __init__(
+        self, object_ids, fail_first=0, delays=None, max_record_count=1000, error=None
+    ):
+        super().__init__(("127.0.0.1", 0), _FeatureServerHandler)
+        self.features = {
+            object_id: _lsoa_feature(object_id) for object_id in object_ids
+        }
+        # how many requests to fail with a 503 before serving properly
+        self.fail_first = fail_first
+        # seconds to wait before answering a request with a given where clause
+        self.delays = delays or {}
+        # the most features to send in one response, as the real server has
+        self.max_record_count = max_record_count
+        # an error to report in the body of an OK response instead of the features, as the real server does
+        self.error = error
+        self.requests = []
+        self.connections = set()
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/query"
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _FeatureServerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server: _FeatureServer = self.server
+        params = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(self.path).query))
+        with server.lock:
+            server.requests.append(params)
+            server.connections.add(self.client_address)
+            fail = server.fail_first > 0
+            server.fail_first -= 1
+        if fail:
+            self._send(503, b"{}")
+            return
+        time.sleep(server.delays.get(params["where"], 0))
+        if server.error is not None:
+            self._send(200, json.dumps({"error": server.error}).encode())
+            return
+        low, high = [int(part.split("=")[1]) for part in params["where"].split(" AND ")]
+        features = [
+            feature
+            for object_id, feature in sorted(server.features.items())
+            if low <= object_id <= high
+        ]
+        offset = int(params.get("resultOffset", 0))
+        count = min(int(params.get("resultRecordCount", 1000)), server.max_record_count)
+        page = features[offset : offset + count]
+        if params["outFields"] != "*":
+            fields = params["outFields"].split(",")
+            page = [
+                {**feature, "properties": {f: feature["properties"][f] for f in fields}}
+                for feature in page
+            ]
+        collection = {"type": "FeatureCollection", "features": page}
+        if offset + count < len(features):
+            collection["properties"] = {"exceededTransferLimit": True}
+        self._send(200, json.dumps(collection).encode())
+
+    def _send(self, status: int, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
 
 
 class MyTestCase(unittest.TestCase):
+    def setUp(self):
+        # the typed copies of the CSV files are kept here rather than alongside them in the data directory
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.cache_dir = cache_dir.name
+
     def test_read_lsoa_objects_england(self):
-        reader = read_lsoa_objects_england()
+        reader = LsoaLoader(typed_cache_dir=self.cache_dir).read_lsoa_objects_england()
         objects = load_lsoa_objects_for_area_england("Cambridge", reader)
         self.assertEqual(228, len(objects))
         expected = pd.DataFrame.from_dict(
@@ -24,6 +197,568 @@ class MyTestCase(unittest.TestCase):
         )
         assert_frame_equal(objects.iloc[[0]], expected)
 
+    def test_build_lsoa_data_frame_for_areas(self):
+        loader = LsoaLoader(typed_cache_dir=self.cache_dir)
+        # areas found by local authority name, and ones which need every LSOA name checking
+        areas = [
+            "Cambridge",
+            "South Cambridge",
+            "bridge",
+            "Cambridge 006",
+            "E",
+            "Camb.idge",
+        ]
+        frames = loader.build_lsoa_data_frame_for_areas(areas)
+        self.assertEqual(areas, list(frames))
+        self.assertEqual(228, len(frames["Cambridge"].index))
+        self.assertEqual(
+            [f"Cambridge 006{letter}" for letter in "ABCDEF"],
+            sorted(frames["Cambridge 006"]["LSOA21NM"]),
+        )
+        for area in areas:
+            # the same as filtering the whole national frames by name
+            lsoas = loader.load_lsoa_objects_for_area_england(
+                area, loader.read_lsoa_objects_england()
+            )
+            population = loader.load_lsoa_population_estimates_england(
+                area, loader.read_lsoa_population_estimates_england()
+            )
+            expected = pd.merge(
+                lsoas, population.drop(columns=["LSOA21NM"]), on="LSOA21CD"
+            )
+            expected["OBJECTID"] = expected["OBJECTID"].astype(str)
+            assert_frame_equal(expected, frames[area])
+            assert_frame_equal(lsoas, loader.load_lsoa_objects_for_area_england(area))
+            assert_frame_equal(
+                population, loader.load_lsoa_population_estimates_england(area)
+            )
+        assert_frame_equal(
+            frames["Cambridge"],
+            loader.build_lsoa_data_frame_for_area_england("Cambridge"),
+        )
+
+    def test_typed_cache(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        loader = LsoaLoader(typed_cache_dir=cache_dir.name)
+        parsed = loader.read_lsoa_population_estimates_england()
+        self.assertEqual(
+            ["lsoa_global_number_residents_2021.arrow"], os.listdir(cache_dir.name)
+        )
+        cached = loader.read_lsoa_population_estimates_england()
+        assert_frame_equal(parsed, cached)
+        self.assertEqual("int64", cached["all ages"].dtype)
+        self.assertEqual(
+            ["LSOA21CD", "all ages"],
+            list(
+                loader.read_lsoa_population_estimates_england(
+                    columns=["LSOA21CD", "all ages"]
+                ).columns
+            ),
+        )
+        # areas have the same rows and column types as from a frame read straight from the CSV
+        plain = pd.read_csv(
+            loader.population_data_path,
+            header=0,
+            skiprows=9,
+            names=["LSOA21NM", "LSOA21CD", "all ages"],
+            dtype="string",
+        )
+        assert_frame_equal(
+            loader.load_lsoa_population_estimates_england("Cambridge", plain),
+            loader.load_lsoa_population_estimates_england("Cambridge"),
+        )
+
+        # a cache file which can't be read is parsed again and replaced
+        cache_path = os.path.join(
+            cache_dir.name, "lsoa_global_number_residents_2021.arrow"
+        )
+        with open(cache_path, "wb") as f:
+            f.write(b"not arrow")
+        assert_frame_equal(parsed, loader.read_lsoa_population_estimates_england())
+        assert_frame_equal(parsed, loader.read_lsoa_population_estimates_england())
+        self.assertGreater(os.path.getsize(cache_path), len(b"not arrow"))
+
+        # different settings give a different frame, so the cache is rebuilt
+        loader = LsoaLoader(typed_cache_dir=cache_dir.name, population_skip_rows=10)
+        self.assertEqual(
+            len(parsed.index) - 1,
+            len(loader.read_lsoa_population_estimates_england().index),
+        )
+
+    def test_load_geo_json_shapefiles_for_lsoas(self):
+        # three chunks of consecutive object ids, where the first chunk is the slowest to answer
+        object_ids = [1, 2, 3, 7, 8, 20]
+        server = _FeatureServer(
+            range(1, 25), delays={"OBJECTID>=1 AND OBJECTID<=3": 0.2}
+        )
+        self.addCleanup(server.close)
+        lsoas = pd.DataFrame(
+            {
+                "OBJECTID": object_ids,
+                "LSOA21CD": [f"E{object_id:08d}" for object_id in object_ids],
+            }
+        )
+        loader = LsoaLoader(boundaries_query_url=server.url, fetch_max_workers=3)
+        shapefile = loader.load_geo_json_shapefiles_for_lsoas(lsoas)
+        self.assertEqual(
+            object_ids,
+            [feature["properties"]["OBJECTID"] for feature in shapefile["features"]],
+        )
+        self.assertEqual(3, len(server.requests))
+        self.assertEqual("4326", server.requests[0]["outSR"])
+
+        # connections are kept open and reused for later chunks
+        server.requests.clear()
+        server.connections.clear()
+        loader = LsoaLoader(boundaries_query_url=server.url, fetch_max_workers=1)
+        loader.load_geo_json_shapefiles_for_lsoas(lsoas)
+        self.assertEqual(3, len(server.requests))
+        self.assertEqual(1, len(server.connections))
+
+    def test_load_geo_json_shapefiles_for_lsoas_area(self):
+        server = _FeatureServer(range(1, 10))
+        self.addCleanup(server.close)
+        # the LSOA with object id 5 has a different code in the area than in the boundaries, so is left out
+        lsoas = pd.DataFrame(
+            {
+                "OBJECTID": [3, 4, 5],
+                "LSOA21CD": ["E00000003", "E00000004", "E99999999"],
+                "LSOA21NM": ["Area 001A", "Area 001B", "Area 001C"],
+            }
+        )
+        loader = LsoaLoader(boundaries_query_url=server.url)
+        unfiltered = loader.load_geo_json_shapefiles_for_lsoas(lsoas)
+        self.assertEqual(3, len(unfiltered["features"]))
+        shapefile = loader.load_geo_json_shapefiles_for_lsoas(lsoas, area="Area")
+        self.assertEqual(
+            [
+                {
+                    "OBJECTID": 3,
+                    "LSOA21CD": "E00000003",
+                    "Shape__Area": 3000.0,
+                    "LSOA21NM": "Area 001A",
+                },
+                {
+                    "OBJECTID": 4,
+                    "LSOA21CD": "E00000004",
+                    "Shape__Area": 4000.0,
+                    "LSOA21NM": "Area 001B",
+                },
+            ],
+            [feature["properties"] for feature in shapefile["features"]],
+        )
+
+    def test_load_geo_json_shapefiles_for_lsoas_pages(self):
+        server = _FeatureServer(range(1, 30), max_record_count=3)
+        self.addCleanup(server.close)
+        object_ids = list(range(1, 12)) + [20]
+        lsoas = pd.DataFrame(
+            {
+                "OBJECTID": [str(object_id) for object_id in reversed(object_ids)],
+                "LSOA21CD": [f"E{object_id:08d}" for object_id in reversed(object_ids)],
+            }
+        )
+        # 1-11 is split into chunks of 1-5, 6-10 and 11, then the server only sends 3 records at a time
+        loader = LsoaLoader(boundaries_query_url=server.url, fetch_page_size=5)
+        shapefile = loader.load_geo_json_shapefiles_for_lsoas(
+            lsoas, out_fields=["Shape__Area"], geometry_precision=5
+        )
+        self.assertEqual(
+            object_ids,
+            [feature["properties"]["OBJECTID"] for feature in shapefile["features"]],
+        )
+        self.assertEqual(
+            {"OBJECTID": 1, "LSOA21CD": "E00000001", "Shape__Area": 1000.0},
+            shapefile["features"][0]["properties"],
+        )
+        self.assertEqual(6, len(server.requests))
+        self.assertEqual(
+            {"OBJECTID>=1 AND OBJECTID<=5", "OBJECTID>=6 AND OBJECTID<=10"},
+            {r["where"] for r in server.requests if r["resultOffset"] == "3"},
+        )
+        self.assertEqual(
+            "OBJECTID,LSOA21CD,Shape__Area", server.requests[0]["outFields"]
+        )
+        self.assertEqual("5", server.requests[0]["geometryPrecision"])
+
+    def test_load_geo_json_shapefiles_for_lsoas_retries(self):
+        server = _FeatureServer(range(1, 5), fail_first=2)
+        self.addCleanup(server.close)
+        lsoas = pd.DataFrame(
+            {"OBJECTID": [1, 2], "LSOA21CD": ["E00000001", "E00000002"]}
+        )
+        loader = LsoaLoader(
+            boundaries_query_url=server.url, fetch_retries=2, fetch_backoff_factor=0
+        )
+        shapefile = loader.load_geo_json_shapefiles_for_lsoas(lsoas)
+        self.assertEqual(2, len(shapefile["features"]))
+        self.assertEqual(3, len(server.requests))
+
+        server.fail_first = 2
+        loader = LsoaLoader(
+            boundaries_query_url=server.url, fetch_retries=1, fetch_backoff_factor=0
+        )
+        with self.assertRaises(requests.HTTPError):
+            loader.load_geo_json_shapefiles_for_lsoas(lsoas)
+
+    def test_load_geo_json_shapefiles_for_lsoas_cache(self):
+        server = _FeatureServer(range(1, 10))
+        self.addCleanup(server.close)
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        lsoas = pd.DataFrame(
+            {"OBJECTID": [1, 2, 5], "LSOA21CD": ["E00000001", "E00000002", "E00000005"]}
+        )
+        loader = LsoaLoader(boundaries_query_url=server.url, cache_dir=cache_dir.name)
+        fetched = loader.load_geo_json_shapefiles_for_lsoas(lsoas)
+        self.assertEqual(2, len(server.requests))
+
+        cached = loader.load_geo_json_shapefiles_for_lsoas(lsoas)
+        self.assertEqual(2, len(server.requests))
+        self.assertEqual(fetched, cached)
+
+        offline = LsoaLoader(
+            boundaries_query_url=server.url, cache_dir=cache_dir.name, offline=True
+        )
+        self.assertEqual(fetched, offline.load_geo_json_shapefiles_for_lsoas(lsoas))
+        with self.assertRaises(ValueError):
+            # a different range of object ids isn't in the cache
+            offline.load_geo_json_shapefiles_for_lsoas(lsoas.iloc[[0]])
+        self.assertEqual(2, len(server.requests))
+
+    def test_load_geo_json_shapefiles_for_lsoas_error(self):
+        server = _FeatureServer(
+            range(1, 5), error={"code": 400, "message": "Invalid query"}
+        )
+        self.addCleanup(server.close)
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        lsoas = pd.DataFrame(
+            {"OBJECTID": [1, 2], "LSOA21CD": ["E00000001", "E00000002"]}
+        )
+        loader = LsoaLoader(boundaries_query_url=server.url, cache_dir=cache_dir.name)
+        with self.assertRaisesRegex(ValueError, "Invalid query"):
+            loader.load_geo_json_shapefiles_for_lsoas(lsoas)
+        with self.assertRaisesRegex(ValueError, "Invalid query"):
+            list(loader.iter_geo_json_features_for_lsoas(lsoas))
+        # the error isn't cached, so is asked for again
+        with self.assertRaisesRegex(ValueError, "Invalid query"):
+            loader.load_geo_json_shapefiles_for_lsoas(lsoas)
+        self.assertEqual(3, len(server.requests))
+
+    def test_iter_geo_json_features_for_lsoas(self):
+        server = _FeatureServer(range(1, 30), max_record_count=3)
+        self.addCleanup(server.close)
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        object_ids = list(range(1, 12)) + [20]
+        lsoas = pd.DataFrame(
+            {
+                "OBJECTID": object_ids,
+                "LSOA21CD": [f"E{object_id:08d}" for object_id in object_ids],
+                "LSOA21NM": [f"Area {object_id:03d}A" for object_id in object_ids],
+            }
+        )
+        loader = LsoaLoader(
+            boundaries_query_url=server.url, fetch_page_size=5, cache_dir=cache_dir.name
+        )
+        expected = LsoaLoader(
+            boundaries_query_url=server.url,
+            fetch_page_size=5,
+            typed_cache_dir=self.cache_dir,
+        ).load_geo_json_shapefiles_for_lsoas(lsoas, area="Area")
+        requests_made = len(server.requests)
+        fetched = list(loader.iter_geo_json_features_for_lsoas(lsoas, area="Area"))
+        self.assertEqual(expected["features"], fetched)
+        self.assertEqual(2 * requests_made, len(server.requests))
+
+        # the streamed responses are cached, and read back from the cache a piece at a time
+        offline = LsoaLoader(
+            boundaries_query_url=server.url,
+            fetch_page_size=5,
+            cache_dir=cache_dir.name,
+            offline=True,
+        )
+        self.assertEqual(
+            fetched, list(offline.iter_geo_json_features_for_lsoas(lsoas, area="Area"))
+        )
+        self.assertEqual(
+            expected, offline.load_geo_json_shapefiles_for_lsoas(lsoas, area="Area")
+        )
+        self.assertEqual(2 * requests_made, len(server.requests))
+
+    def test_iter_feature_collection(self):
+        collection = {
+            "type": "FeatureCollection",
+            "features": [_lsoa_feature(object_id) for object_id in range(1, 4)],
+            "properties": {"exceededTransferLimit": True},
+        }
+        text = json.dumps(collection)
+        for size in [1, 7, len(text)]:
+            features = iter_feature_collection(
+                text[start : start + size] for start in range(0, len(text), size)
+            )
+            self.assertEqual(collection["features"], list(features))
+        features = iter_feature_collection([text])
+        for _ in collection["features"]:
+            next(features)
+        with self.assertRaises(StopIteration) as stop:
+            next(features)
+        self.assertEqual(
+            {
+                "type": "FeatureCollection",
+                "features": [],
+                "properties": {"exceededTransferLimit": True},
+            },
+            stop.exception.value,
+        )
+        with self.assertRaises(ValueError):
+            list(iter_feature_collection([text[:-10]]))
+
+
+class LsoaShapefileTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = _write_shapefile(directory.name)
+
+    def test_load_geo_json_shapefiles_for_lsoas(self):
+        loader = LsoaLoader(boundaries_shapefile_path=self.path)
+        lsoas = pd.DataFrame(
+            {
+                "LSOA21CD": ["E00000007", "E00000002", "E00000002", "E99999999"],
+                "LSOA21NM": ["Area 001A", "Area 001B", "Area 001B", "Area 001C"],
+            }
+        )
+        shapefile = loader.load_geo_json_shapefiles_for_lsoas(lsoas)
+        self.assertEqual(
+            [
+                {"LSOA21CD": "E00000002", "LSOA21NM": "Cambridge 002A"},
+                {"LSOA21CD": "E00000007", "LSOA21NM": "Cambridge 007A"},
+            ],
+            [feature["properties"] for feature in shapefile["features"]],
+        )
+        # the boundaries are given in latitude and longitude, as from the FeatureServer
+        lon, lat = shapefile["features"][0]["geometry"]["coordinates"][0][0]
+        self.assertAlmostEqual(0.16, lon, places=1)
+        self.assertAlmostEqual(52.2, lat, places=1)
+
+        shapefile = loader.load_geo_json_shapefiles_for_lsoas(
+            lsoas, area="Area", out_fields=[], geometry_precision=3
+        )
+        self.assertEqual(
+            [
+                {"LSOA21CD": "E00000002", "LSOA21NM": "Area 001B"},
+                {"LSOA21CD": "E00000007", "LSOA21NM": "Area 001A"},
+            ],
+            [feature["properties"] for feature in shapefile["features"]],
+        )
+        for lon, lat in shapefile["features"][0]["geometry"]["coordinates"][0]:
+            self.assertEqual(round(lon, 3), lon)
+
+        # streamed a page of codes at a time
+        loader.fetch_page_size = 1
+        self.assertEqual(
+            shapefile["features"],
+            list(
+                loader.iter_geo_json_features_for_lsoas(
+                    lsoas, area="Area", out_fields=[], geometry_precision=3
+                )
+            ),
+        )
+
+    def test_build_lsoa_geo_data_frame_for_area_england(self):
+        loader = LsoaLoader(
+            boundaries_shapefile_path=self.path,
+            **_write_lsoa_csvs(os.path.dirname(self.path)),
+        )
+        lsoas = loader.build_lsoa_geo_data_frame_for_area_england("Cambridge")
+        self.assertIsInstance(lsoas, gpd.GeoDataFrame)
+        self.assertEqual("EPSG:4326", lsoas.crs)
+        self.assertEqual(
+            ["OBJECTID", "LSOA21CD", "LSOA21NM", "GlobalID", "all ages", "geometry"],
+            list(lsoas.columns),
+        )
+        assert_frame_equal(
+            loader.build_lsoa_data_frame_for_area_england("Cambridge"),
+            pd.DataFrame(lsoas.drop(columns="geometry")),
+        )
+        self.assertTrue(lsoas.has_sindex)
+        # the LSOAs around the corner shared by the first two in each of the first two rows, found with one
+        # bulk query
+        corner = Point(
+            pyproj.Transformer.from_crs(
+                "EPSG:27700", "EPSG:4326", always_xy=True
+            ).transform(546000, 259000)
+        ).buffer(0.001)
+        self.assertEqual(
+            ["E00000001", "E00000002", "E00000005", "E00000006"],
+            sorted(
+                lsoas["LSOA21CD"].iloc[
+                    lsoas.sindex.query(corner, predicate="intersects")
+                ]
+            ),
+        )
+
+        # the same from the FeatureServer, where the boundaries are points
+        server = _FeatureServer(range(1, 13))
+        self.addCleanup(server.close)
+        loader = LsoaLoader(
+            boundaries_query_url=server.url,
+            **_write_lsoa_csvs(os.path.dirname(self.path)),
+        )
+        fetched = loader.build_lsoa_geo_data_frame_for_area_england("Cambridge")
+        assert_frame_equal(
+            pd.DataFrame(lsoas.drop(columns="geometry")),
+            pd.DataFrame(fetched.drop(columns=["geometry", "Shape__Area"])),
+        )
+        self.assertEqual(2000.0, fetched["Shape__Area"][1])
+        self.assertTrue((fetched.geom_type == "Point").all())
+
+    def test_load_geo_json_shapefiles_in_bbox(self):
+        loader = LsoaLoader(boundaries_shapefile_path=self.path)
+        # a small box around the corner where LSOAs 6, 7, 10 and 11 meet
+        lsoa_6 = LsoaShapefile(self.path).read_codes(["E00000006"])
+        _, _, lon, lat = lsoa_6.total_bounds
+        shapefile = loader.load_geo_json_shapefiles_in_bbox(
+            lon - 0.001, lat - 0.001, lon + 0.001, lat + 0.001
+        )
+        self.assertEqual(
+            ["E00000006", "E00000007", "E00000010", "E00000011"],
+            [feature["properties"]["LSOA21CD"] for feature in shapefile["features"]],
+        )
+        self.assertEqual(
+            [],
+            loader.load_geo_json_shapefiles_in_bbox(1.0, 53.0, 1.1, 53.1)["features"],
+        )
+        with self.assertRaises(ValueError):
+            LsoaLoader(
+                cache_dir=os.path.dirname(self.path),
+                typed_cache_dir=os.path.dirname(self.path),
+            ).load_geo_json_shapefiles_in_bbox(0.1, 52.1, 0.2, 52.2)
+
+    def test_index_is_kept_alongside_the_file(self):
+        LsoaShapefile(self.path)
+        index_path = self.path[: -len(".shp")] + ".index.npz"
+        self.assertTrue(os.path.exists(index_path))
+        os.utime(index_path, ns=(0, 0))
+        LsoaShapefile(self.path)
+        self.assertEqual(0, os.stat(index_path).st_mtime_ns)
+
+        # a changed shapefile has its index rebuilt
+        gpd.read_file(self.path).iloc[:3].to_file(self.path)
+        self.assertEqual(3, len(LsoaShapefile(self.path).read_bbox(0, 52, 1, 53)))
+        self.assertNotEqual(0, os.stat(index_path).st_mtime_ns)
+
+    def test_empty_shapefile(self):
+        with warnings.catch_warnings():
+            # geopandas warns that some formats can't be written empty, but shapefiles can
+            warnings.simplefilter("ignore", UserWarning)
+            gpd.read_file(self.path).iloc[:0].to_file(self.path)
+        shapefile = LsoaShapefile(self.path)
+        self.assertEqual(0, len(shapefile.read_codes(["E00000001"]).index))
+        self.assertEqual(0, len(shapefile.read_bbox(0, 52, 1, 53).index))
+
+
+class PostcodeIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "postcodes.csv")
+        with open(self.path, "w") as f:
+            f.write("pcds,lsoa21cd\n")
+            f.write("CB2 1TN,E01017943\n")
+            f.write("CB1 2AB,E01017944\n")
+            f.write("cb1 1aa,\n")
+            f.write("CB1 1AB,E01017945\n")
+            f.write("CB21TN,E99999999\n")
+
+    def test_lookup(self):
+        index = PostcodeIndex(self.path)
+        self.assertEqual(
+            ["E01017943", "E01017944", "", "", "", ""],
+            index.lookup(
+                ["cb2 1tn", "CB12AB", "CB1 1AA", "CB9 9ZZ", "CB2 1TNX", ""]
+            ).tolist(),
+        )
+        self.assertEqual("E01017943", index.lookup("CB2 1TN")[0])
+        # the first postcode starting with the prefix which has an LSOA
+        self.assertEqual("E01017945", index.lookup_prefix("CB1"))
+        self.assertIsNone(index.lookup_prefix("CB3"))
+        self.assertEqual(
+            ["E01017943", "", "E01017945"],
+            lookup_lsoa_codes_for_postcodes(
+                ["CB2 1TN", "CB1 1AA", "CB1 1AB"], lsoa_postcode_map_file_path=self.path
+            ).tolist(),
+        )
+
+    def test_index_is_kept_alongside_the_file(self):
+        index = PostcodeIndex(self.path)
+        index_dir = self.path[: -len(".csv")] + ".postcodeindex"
+        self.assertEqual(
+            ["index.json", "lsoa_codes.npy", "postcodes.npy"],
+            sorted(os.listdir(index_dir)),
+        )
+        # the arrays aren't sent when pickling, as the other process maps the same files
+        self.assertLess(len(pickle.dumps(index)), 1000)
+        self.assertEqual(
+            "E01017944", pickle.loads(pickle.dumps(index)).lookup("CB1 2AB")[0]
+        )
+
+        # a changed mapping file has its index rebuilt
+        with open(self.path, "a") as f:
+            f.write("CB3 0AA,E01017946\n")
+        self.assertEqual("E01017946", PostcodeIndex(self.path).lookup("CB3 0AA")[0])
+
+    def test_load_lsoa_objects_for_postcode_england(self):
+        global_lsoa = LsoaLoader(
+            typed_cache_dir=os.path.dirname(self.path)
+        ).read_lsoa_objects_england()
+        objects = load_lsoa_objects_for_postcode_england(
+            "cb21tn", global_lsoa, lsoa_postcode_map_file_path=self.path
+        )
+        self.assertEqual(228, len(objects))
+        self.assertEqual(
+            228,
+            len(
+                load_lsoa_objects_for_postcode_england(
+                    "CB2", global_lsoa, lsoa_postcode_map_file_path=self.path
+                )
+            ),
+        )
+        with self.assertRaises(ValueError):
+            load_lsoa_objects_for_postcode_england(
+                "CB9 9ZZ", global_lsoa, lsoa_postcode_map_file_path=self.path
+            )
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    def test_least_recently_used_are_evicted(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ResponseCache(cache_dir, max_bytes=25)
+            keys = [ResponseCache.key("http://test", {"n": n}) for n in range(3)]
+            cache.put(keys[0], "0" * 10)
+            cache.put(keys[1], "1" * 10)
+            # give both the same old time, so only reading the first makes the second the least recently used
+            for key in keys[0:2]:
+                os.utime(os.path.join(cache_dir, key + ".json"), ns=(0, 0))
+            self.assertEqual("0" * 10, cache.get(keys[0]))
+            cache.put(keys[2], "2" * 10)
+            self.assertEqual("0" * 10, cache.get(keys[0]))
+            self.assertIsNone(cache.get(keys[1]))
+            self.assertEqual("2" * 10, cache.get(keys[2]))
+
+    def test_key(self):
+        self.assertEqual(
+            ResponseCache.key("http://test", {"a": 1, "b": 2}),
+            ResponseCache.key("http://test", {"b": 2, "a": 1}),
+        )
+        self.assertNotEqual(
+            ResponseCache.key("http://test", {"a": 1}),
+            ResponseCache.key("http://test", {"a": 2}),
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+
+from nhstravel.batch import (
+    calculate_walking_distance_polys_batch,
+    completed_triangles,
+    read_batch_output,
+)
+from nhstravel.gp import GpRegion
+from nhstraveltests.fixtures import grid_graph, triangle_with_middle_df
+
+
+class BatchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.region = GpRegion._from_df(triangle_with_middle_df())
+        self.graph = grid_graph(-0.1, 51.495, -0.075, 51.525, 0.001)
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.output_dir.cleanup)
+
+    def run_batch(self, **kwargs):
+        return calculate_walking_distance_polys_batch(
+            self.region,
+            self.output_dir.name,
+            processes=2,
+            chunk_size=2,
+            graph=self.graph,
+            verbose=False,
+            **kwargs,
+        )
+
+    def test_calculate_walking_distance_polys_batch(self):
+        summary = self.run_batch()
+        self.assertEqual(3, summary["total"])
+        self.assertEqual(3, summary["computed"])
+        self.assertEqual(0, summary["failed"])
+        self.assertEqual([0, 1, 2], completed_triangles(self.output_dir.name).tolist())
+
+        output = read_batch_output(self.output_dir.name)
+        self.assertEqual({0, 1, 2}, set(output["triangle"]))
+        for i in range(3):
+            expected = self.region.calculate_walking_distance_polys(
+                self.region.get_triangle(i), graph=self.graph
+            )
+            actual = output[output["triangle"] == i]
+            self.assertEqual(list(expected.index), list(actual["bucket_dist"]))
+            self.assertAlmostEqual(
+                sum(p.area for p in expected["mp"]),
+                sum(p.area for p in actual["mp"]),
+                places=10,
+            )
+
+    def test_calculate_walking_distance_polys_batch_resumes(self):
+        self.run_batch()
+        os.remove(os.path.join(self.output_dir.name, "part-0000002.parquet"))
+
+        summary = self.run_batch()
+        self.assertEqual(2, summary["skipped"])
+        self.assertEqual(1, summary["computed"])
+
+        summary = self.run_batch()
+        self.assertEqual(3, summary["skipped"])
+        self.assertEqual(0, summary["computed"])
+
+    def test_calculate_walking_distance_polys_batch_different_settings(self):
+        self.run_batch()
+        with self.assertRaises(ValueError):
+            self.run_batch(radius_minutes=10.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,21 @@
+import os
+import tempfile
 import unittest
 
+import networkx
+import numpy as np
 import pandas as pd
-from shapely.geometry import Point, Polygon
-from nhstravel.gp import GpRegion
+import shapely
+from haversine import haversine, Unit
+from shapely.geometry import MultiPolygon, Point, Polygon, box
+from nhstravel.gp import (
+    GpRegion,
+    _build_node_data,
+    _join_distances_to_polygons,
+)
+from nhstravel.loaders import gploader
+from nhstravel.routing import CsrGraph
+from nhstraveltests.fixtures import grid_graph, triangle_with_middle_df
 
 
 class MyTestCase(unittest.TestCase):
@@ -15,6 +28,78 @@ class MyTestCase(unittest.TestCase):
         botley_location = botley_df.iloc[0]["point"]
         self.assertEqual(botley_location, Point(-1.2983483, 51.7527945))
 
+    def test_find_practices_matches_full_scan(self):
+        df = triangle_with_middle_df()
+        df["Name"] = ["TOP SURGERY", "LEFT SURGERY", "RIGHT HEALTH CENTRE", "MIDDLE"]
+        df["Postcode"] = ["TS18 1HU", "TS1 2AW", "TS18 2AT", "T1 1AA"]
+        area = GpRegion._from_df(df)
+        for name in [
+            "",
+            "t",
+            "su",
+            "surgery",
+            "t surgery",
+            "RIGHT H",
+            "none",
+            "TOP|LEFT",
+        ]:
+            self.assertEqual(
+                list(df.index[df["Name"].str.contains(name.upper())]),
+                list(area.find_practices(name).index),
+                name,
+            )
+        for prefix in ["", "t", "TS1", "TS18", "ts18 2", "T1 1AA", "TS2", "A", "Z"]:
+            self.assertEqual(
+                list(df.index[df["Postcode"].str.startswith(prefix.upper())]),
+                list(area.find_practices_postcode_prefix(prefix).index),
+                prefix,
+            )
+
+    def test_nearest_practices(self):
+        df = triangle_with_middle_df()
+        df.index = [10, 11, 12, 13]
+        area = GpRegion._from_df(df)
+        lats = np.array([51.521, 51.505, 51.502])
+        lons = np.array([-0.085, -0.094, -0.081])
+        indices, distances = area.nearest_practices(lats, lons, k=2)
+        self.assertEqual([[10, 13], [11, 13], [12, 13]], indices.tolist())
+        for i in range(3):
+            for j in range(2):
+                practice = df.loc[indices[i, j]]
+                expected = haversine(
+                    (lats[i], lons[i]),
+                    (practice["latitude"], practice["longitude"]),
+                    unit=Unit.METERS,
+                )
+                self.assertAlmostEqual(expected, distances[i, j], places=3)
+        self.assertEqual((3, 1), area.nearest_practices(lats, lons)[0].shape)
+        with self.assertRaises(ValueError):
+            area.nearest_practices(lats, lons, k=5)
+
+    def test_locate_triangles(self):
+        df = triangle_with_middle_df()
+        area = GpRegion._from_df(df)
+        triangles = area.get_triangles()
+        points = np.array(
+            [
+                [-0.085, 51.515],  # between TOP and MIDDLE
+                [-0.086, 51.505],  # below MIDDLE
+                [-0.085, 51.51],  # at MIDDLE, a corner of all three triangles
+                [-0.2, 51.51],  # outside
+            ]
+        )
+        located, practices = area.locate_triangles(points)
+        for i in range(3):
+            self.assertTrue(triangles.iloc[located[i]].intersects(Point(points[i])))
+            corners = shapely.get_coordinates(triangles.iloc[located[i]])[0:3]
+            self.assertEqual(
+                corners.tolist(),
+                df.iloc[practices[i]][["longitude", "latitude"]].to_numpy().tolist(),
+            )
+        self.assertEqual(0, located[2])
+        self.assertEqual(-1, located[3])
+        self.assertEqual([-1, -1, -1], practices[3].tolist())
+
     def test_get_practice_area(self):
         data = {
             "Name": ["TOP", "LEFT", "RIGHT", "MIDDLE"],
@@ -51,7 +136,166 @@ class MyTestCase(unittest.TestCase):
                 Point(-0.080, 51.50),
             ]
         )
-        self.assertEqual(str(botley_area.area), str(expected))
+        # the same ring, though which vertex it starts from depends on the GEOS version
+        self.assertTrue(botley_area.area.equals(expected))
+        self.assertEqual(expected.exterior.is_ccw, botley_area.area.exterior.is_ccw)
+
+    def test_get_all_practice_areas(self):
+        area = GpRegion._from_df(triangle_with_middle_df())
+        all_areas = area.get_all_practice_areas()
+        self.assertEqual(list(area.get_df().index), list(all_areas.index))
+        for index in area.get_df().index:
+            self.assertTrue(all_areas[index].equals(area.get_practice_area(index).area))
+        # the corners are on the edge of the triangulation, so their area includes the practice itself
+        top_index = area.find_practices("TOP").index[0]
+        self.assertTrue(
+            all_areas[top_index].touches(area.get_df().loc[top_index]["point"])
+        )
+
+    def test_get_subregion_by_filter(self):
+        area = GpRegion._from_df(triangle_with_middle_df())
+        self.assertEqual(3, len(area.get_triangles()))
+        top_df = area.find_practices("TOP")
+        subregion = area.get_subregion_by_filter(area.get_df()["Name"] == "TOP")
+        # only the two triangles with TOP as a corner, but the filtered practices only
+        self.assertEqual(2, len(subregion.get_triangles()))
+        self.assertEqual(list(top_df.index), list(subregion.get_df().index))
+        for triangle in subregion.get_triangles():
+            self.assertTrue(triangle.touches(top_df.iloc[0]["point"]))
+
+    def test_get_subregion_by_poly(self):
+        area = GpRegion._from_df(triangle_with_middle_df())
+        # a small box just above the bottom edge only overlaps the LEFT, RIGHT, MIDDLE triangle
+        subregion = area.get_subregion_by_poly(box(-0.0876, 51.5001, -0.0875, 51.5002))
+        self.assertEqual(1, len(subregion.get_triangles()))
+        self.assertEqual(
+            ["LEFT", "RIGHT", "MIDDLE"], list(subregion.get_df()["Name"].values)
+        )
+        self.assertEqual(0, len(area.get_subregion_by_poly(box(1, 1, 2, 2)).get_df()))
+
+    def test_load_england_snapshot(self):
+        with tempfile.TemporaryDirectory() as directory:
+            gp_data_path = os.path.join(directory, "gp_data.csv")
+            snapshot_path = os.path.join(directory, "england.npz")
+            gp_data = triangle_with_middle_df().assign(
+                **{"Prescribing Setting": 4, "Status Code": "A"}
+            )
+            gp_data["National Grouping"] = "Y63"
+            gp_data["High Level Health Geography"] = "Q71"
+            gp_data["Postcode"] = ["EC1A 1AA", "EC1A 1AB", "EC1A 1AC", "EC1A 1AD"]
+            gp_data.to_csv(gp_data_path)
+
+            built = GpRegion.load_england(gp_data_path, snapshot_path=snapshot_path)
+            self.assertTrue(os.path.exists(snapshot_path))
+            loaded = GpRegion.load_snapshot(snapshot_path)
+            pd.testing.assert_frame_equal(built.get_df(), loaded.get_df())
+            np.testing.assert_array_equal(built._simplices, loaded._simplices)
+            self.assertTrue(
+                built.get_practice_area(3).area.equals(loaded.get_practice_area(3).area)
+            )
+
+            # a different filter, or different file content, doesn't use the snapshot
+            self.assertIsNone(
+                GpRegion.load_snapshot(
+                    snapshot_path,
+                    gploader.load_england_hash(gp_data_path, only_gp=False),
+                )
+            )
+            gp_data.loc[3, "Status Code"] = "C"
+            gp_data.to_csv(gp_data_path)
+            rebuilt = GpRegion.load_england(gp_data_path, snapshot_path=snapshot_path)
+            self.assertEqual(3, len(rebuilt.get_df().index))
+
+    def test_build_node_data(self):
+        # a line of nodes 0 - 1 - 2 - 3 - 4 with 10m between each, walkable both ways, plus an unreachable node 5
+        graph = networkx.MultiDiGraph()
+        graph.add_nodes_from(range(6), x=0.0, y=0.0)
+        for u in range(4):
+            graph.add_edge(u, u + 1, length=10.0)
+            graph.add_edge(u + 1, u, length=10.0)
+        csrgraph = CsrGraph.from_graph(graph)
+        # nodes past the cutoff go in one bucket at the end
+        node_data = _build_node_data(
+            csrgraph,
+            np.full(6, True),
+            csrgraph.shortest_path_lengths(csrgraph.positions([0]), cutoff=25.0),
+            bucket_distance_m=10.0,
+            max_distance_m=25.0,
+        )
+        self.assertEqual(
+            {0: 0, 1: 1, 2: 2, 3: 3, 4: 3, 5: 3},
+            dict(zip(node_data["node_index"], node_data["bucket_dist"])),
+        )
+        # with a cutoff of a whole number of buckets, a node exactly at the cutoff shares their bucket
+        node_data = _build_node_data(
+            csrgraph,
+            np.full(6, True),
+            csrgraph.shortest_path_lengths(csrgraph.positions([0]), cutoff=30.0),
+            bucket_distance_m=10.0,
+            max_distance_m=30.0,
+        )
+        self.assertEqual(
+            {0: 0, 1: 1, 2: 2, 3: 3, 4: 3, 5: 3},
+            dict(zip(node_data["node_index"], node_data["bucket_dist"])),
+        )
+        # without a cutoff, unreached nodes are left out
+        node_data = _build_node_data(
+            csrgraph,
+            np.full(6, True),
+            csrgraph.shortest_path_lengths(csrgraph.positions([0])),
+            bucket_distance_m=10.0,
+        )
+        self.assertEqual(
+            {0: 0, 1: 1, 2: 2, 3: 3, 4: 4},
+            dict(zip(node_data["node_index"], node_data["bucket_dist"])),
+        )
+
+    def test_join_distances_to_polygons(self):
+        limit = box(0, 0, 4, 4)
+        node_data = pd.DataFrame(
+            {
+                "point": [Point(1, 1), Point(3, 1), Point(1, 3), Point(3, 3)],
+                "bucket_dist": [0, 0, 1, 2],
+            }
+        )
+        result = _join_distances_to_polygons(node_data, limit)
+        self.assertEqual([0, 1, 2], list(result.index))
+        self.assertAlmostEqual(8.0, result.loc[0, "mp"].area)
+        self.assertTrue(result.loc[1, "mp"].equals(MultiPolygon([box(0, 2, 2, 4)])))
+        self.assertTrue(result.loc[2, "mp"].contains(Point(3, 3)))
+
+    def test_calculate_walking_distance_polys_with_graph(self):
+        area = GpRegion._from_df(triangle_with_middle_df())
+        graph = grid_graph(-0.1, 51.495, -0.075, 51.525, step=0.0005)
+        triangle = area.get_triangle(0)
+        result = area.calculate_walking_distance_polys(
+            triangle, radius_minutes=2, graph=graph
+        )
+        self.assertGreater(len(result.index), 1)
+        self.assertEqual(sorted(result.index), list(result.index))
+        # the buckets split up the whole triangle
+        self.assertAlmostEqual(triangle.area, result["mp"].area.sum())
+        self.assertAlmostEqual(
+            0.0, result["mp"].unary_union.symmetric_difference(triangle).area
+        )
+
+    def test_calculate_walking_distance_polys_with_max_minutes(self):
+        area = GpRegion._from_df(triangle_with_middle_df())
+        graph = grid_graph(-0.1, 51.495, -0.075, 51.525, step=0.0005)
+        triangle = area.get_triangle(0)
+        # a slow walk, so that much of the triangle is further than max_minutes from the corners
+        result = area.calculate_walking_distance_polys(
+            triangle,
+            travel_speed_kmh=1.0,
+            radius_minutes=10,
+            max_minutes=25,
+            graph=graph,
+        )
+        # 0-10, 10-20 and 20-25 minutes, then everywhere further in the bucket straight after
+        self.assertEqual([0, 1, 2, 3], list(result.index))
+        self.assertAlmostEqual(
+            0.0, result["mp"].unary_union.symmetric_difference(triangle).area
+        )
 
 
 if __name__ == "__main__":
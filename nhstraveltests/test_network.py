@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+
+import osmnx
+import osmnx.truncate
+from shapely.geometry import Polygon
+
+from nhstravel.gp import GpRegion
+from nhstravel.network import RoadNetwork
+from nhstraveltests.fixtures import grid_graph, triangle_with_middle_df
+
+
+def _edge_set(graph):
+    return {(u, v, round(length, 2)) for u, v, length in graph.edges(data="length")}
+
+
+class RoadNetworkTestCase(unittest.TestCase):
+    def setUp(self):
+        self.graph = grid_graph(-0.1, 51.495, -0.075, 51.525, 0.001)
+        self.network = RoadNetwork.from_graph(self.graph)
+        self.poly = Polygon(
+            [(-0.095, 51.50), (-0.080, 51.50), (-0.085, 51.52), (-0.095, 51.50)]
+        )
+
+    def test_subgraph(self):
+        subgraph = self.network.subgraph(self.poly)
+        expected = osmnx.truncate.truncate_graph_polygon(
+            self.graph, self.poly, retain_all=True
+        )
+        self.assertEqual(set(expected.nodes), set(subgraph.nodes))
+        self.assertEqual(_edge_set(expected), _edge_set(subgraph))
+        node = next(iter(expected.nodes))
+        self.assertEqual(expected.nodes[node]["x"], subgraph.nodes[node]["x"])
+        self.assertEqual(expected.nodes[node]["y"], subgraph.nodes[node]["y"])
+
+    def test_parallel_edges_keep_shortest(self):
+        u, v = next(iter(self.graph.edges()))
+        self.graph.add_edge(u, v, length=0.5)
+        network = RoadNetwork.from_graph(self.graph)
+        subgraph = network.subgraph(self.poly.envelope.buffer(1))
+        self.assertEqual([0.5], [d["length"] for d in subgraph[u][v].values()])
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "network.npz")
+            self.network.save(path, "abc")
+            self.assertIsNone(RoadNetwork.load(path, "other"))
+            loaded = RoadNetwork.load(path, "abc")
+        self.assertEqual(
+            _edge_set(self.network.subgraph(self.poly)),
+            _edge_set(loaded.subgraph(self.poly)),
+        )
+
+    def test_from_extract(self):
+        with tempfile.TemporaryDirectory() as directory:
+            extract_path = os.path.join(directory, "extract.graphml")
+            store_path = os.path.join(directory, "extract.npz")
+            osmnx.save_graphml(self.graph, extract_path)
+            network = RoadNetwork.from_extract(extract_path, store_path=store_path)
+            self.assertTrue(os.path.exists(store_path))
+            stored = RoadNetwork.from_extract(extract_path, store_path=store_path)
+            self.assertEqual(
+                _edge_set(network.subgraph(self.poly)),
+                _edge_set(stored.subgraph(self.poly)),
+            )
+
+            # a changed extract is read again rather than using the old store
+            self.graph.add_node(-1, x=-0.09, y=51.51)
+            osmnx.save_graphml(self.graph, extract_path)
+            changed = RoadNetwork.from_extract(extract_path, store_path=store_path)
+        self.assertEqual(len(network.graph.node_ids) + 1, len(changed.graph.node_ids))
+
+    def test_calculate_walking_distance_polys_with_network(self):
+        region = GpRegion._from_df(triangle_with_middle_df())
+        triangle = region.get_triangle(0)
+        with_graph = region.calculate_walking_distance_polys(triangle, graph=self.graph)
+        with_network = region.calculate_walking_distance_polys(
+            triangle, network=self.network
+        )
+        self.assertEqual(list(with_graph.index), list(with_network.index))
+        for expected, actual in zip(with_graph["mp"], with_network["mp"]):
+            self.assertAlmostEqual(expected.area, actual.area, places=12)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+
+import networkx
+import numpy as np
+from shapely.geometry import box
+
+from nhstravel.routing import CsrGraph
+from nhstraveltests.fixtures import grid_graph
+
+
+class CsrGraphTestCase(unittest.TestCase):
+    def setUp(self):
+        # a line of nodes 10 - 11 - 12 - 13 - 14 with 10m between each, walkable both ways, plus an unreachable
+        # node 15 and a one way street from 14 to 15
+        self.line = networkx.MultiDiGraph()
+        for u in range(10, 16):
+            self.line.add_node(u, x=float(u), y=0.0)
+        for u in range(10, 14):
+            self.line.add_edge(u, u + 1, length=10.0, travel_time=5.0)
+            self.line.add_edge(u + 1, u, length=10.0, travel_time=5.0)
+        self.line.add_edge(14, 15, length=1.0, travel_time=1.0)
+        self.graph = CsrGraph.from_graph(self.line)
+
+    def lengths_by_id(self, lengths):
+        return dict(zip(self.graph.node_ids.tolist(), lengths.tolist()))
+
+    def test_shortest_path_lengths(self):
+        lengths = self.graph.shortest_path_lengths(self.graph.positions([10]))
+        self.assertEqual(
+            {10: 0.0, 11: 10.0, 12: 20.0, 13: 30.0, 14: 40.0, 15: 41.0},
+            self.lengths_by_id(lengths),
+        )
+        lengths = self.graph.shortest_path_lengths(self.graph.positions([10, 14]))
+        self.assertEqual(
+            {10: 0.0, 11: 10.0, 12: 20.0, 13: 10.0, 14: 0.0, 15: 1.0},
+            self.lengths_by_id(lengths),
+        )
+        lengths = self.graph.shortest_path_lengths(
+            self.graph.positions([10]), cutoff=25.0
+        )
+        self.assertEqual(
+            {10: 0.0, 11: 10.0, 12: 20.0, 13: np.inf, 14: np.inf, 15: np.inf},
+            self.lengths_by_id(lengths),
+        )
+        # the one way street can't be walked back to 14
+        lengths = self.graph.shortest_path_lengths(
+            self.graph.positions([14]), reverse=True
+        )
+        self.assertEqual(np.inf, self.lengths_by_id(lengths)[15])
+        lengths = self.graph.shortest_path_lengths(
+            self.graph.positions([15]), weight="time", reverse=True
+        )
+        self.assertEqual(21.0, self.lengths_by_id(lengths)[10])
+
+    def test_shortest_path_lengths_to_targets(self):
+        graph = CsrGraph.from_graph(grid_graph(-0.1, 51.495, -0.09, 51.505, 0.001))
+        full = graph.shortest_path_lengths(graph.positions([0]))
+        targets = np.flatnonzero(graph.inside(box(-0.1, 51.495, -0.098, 51.497)))
+        lengths = graph.shortest_path_lengths(graph.positions([0]), targets=targets)
+        np.testing.assert_array_equal(full[targets], lengths[targets])
+        # the search stopped short of the far corner of the grid
+        self.assertFalse(np.isfinite(lengths).all())
+        # targets which can't be reached are left infinite
+        lengths = self.graph.shortest_path_lengths(
+            self.graph.positions([14]),
+            reverse=True,
+            targets=self.graph.positions([10, 15]),
+        )
+        self.assertEqual(40.0, self.lengths_by_id(lengths)[10])
+        self.assertEqual(np.inf, self.lengths_by_id(lengths)[15])
+
+    def test_shortest_path_length_matrix(self):
+        matrix = self.graph.shortest_path_length_matrix(
+            self.graph.positions([10, 15]), self.graph.positions([12, 15])
+        )
+        np.testing.assert_array_equal([[20.0, 41.0], [np.inf, 0.0]], matrix)
+
+    def test_shortest_path(self):
+        path = self.graph.shortest_path(*self.graph.positions([11, 15]))
+        self.assertEqual([11, 12, 13, 14, 15], self.graph.node_ids[path].tolist())
+        with self.assertRaises(networkx.NetworkXNoPath):
+            self.graph.shortest_path(*self.graph.positions([15, 11]))
+
+    def test_matches_networkx(self):
+        graph = grid_graph(-0.1, 51.495, -0.09, 51.505, 0.001)
+        csrgraph = CsrGraph.from_graph(graph)
+        lengths = csrgraph.shortest_path_lengths(csrgraph.positions([0]))
+        expected = networkx.single_source_dijkstra_path_length(
+            graph, 0, weight="length"
+        )
+        for node, length in zip(csrgraph.node_ids.tolist(), lengths.tolist()):
+            self.assertAlmostEqual(expected[node], length, places=2)
+
+    def test_subgraph_and_to_networkx(self):
+        subgraph = self.graph.subgraph(box(11.5, -1, 15.5, 1))
+        self.assertEqual([12, 13, 14, 15], subgraph.node_ids.tolist())
+        self.assertIsNone(CsrGraph.from_graph(self.line, time_weight="missing").times)
+        graph = subgraph.to_networkx()
+        self.assertEqual(
+            {(12, 13), (13, 12), (13, 14), (14, 13), (14, 15)}, set(graph.edges())
+        )
+        self.assertEqual(1.0, graph[14][15][0]["travel_time"])
+
+    def test_positions(self):
+        self.assertEqual([4, 0], self.graph.positions([14, 10]).tolist())
+        with self.assertRaises(KeyError):
+            self.graph.positions([99])
+
+
+if __name__ == "__main__":
+    unittest.main()
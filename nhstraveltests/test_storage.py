@@ -0,0 +1,40 @@
+import hashlib
+import os
+import tempfile
+import unittest
+
+from nhstravel.storage import atomic_write, file_digest
+
+
+class StorageTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(self.directory, "file.txt")
+
+    def test_atomic_write(self):
+        with atomic_write(self.path, "w", encoding="utf-8") as f:
+            f.write("first")
+        with self.assertRaises(RuntimeError):
+            with atomic_write(self.path) as f:
+                f.write(b"second")
+                raise RuntimeError()
+        # the failed write leaves the file as it was, and no temporary file behind
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual("first", f.read())
+        self.assertEqual(["file.txt"], os.listdir(self.directory))
+        # readable by others as a file written with open would be, not just by the owner
+        umask = os.umask(0o022)
+        os.umask(umask)
+        self.assertEqual(0o666 & ~umask, os.stat(self.path).st_mode & 0o777)
+
+    def test_file_digest(self):
+        other_path = os.path.join(self.directory, "other.txt")
+        for path, text in [(self.path, b"first"), (other_path, b"second")]:
+            with open(path, "wb") as f:
+                f.write(text)
+        self.assertEqual(
+            hashlib.sha256(b"firstsecond").hexdigest(),
+            file_digest(self.path, other_path).hexdigest(),
+        )
@@ -6,5 +6,12 @@ setup(
     description="Geolocation code for NHS use cases",
     author="NHS Pycom authors",
     packages=["nhstravel.loaders"],
-    py_modules=["nhstravel.info", "nhstravel.gp"],
+    py_modules=[
+        "nhstravel.info",
+        "nhstravel.gp",
+        "nhstravel.batch",
+        "nhstravel.network",
+        "nhstravel.routing",
+        "nhstravel.storage",
+    ],
 )